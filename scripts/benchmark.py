@@ -0,0 +1,193 @@
+"""
+    Benchmarks each stage of the preprocessing and inference pipeline over the
+    fixture articles using the models in models/.
+
+    Reports cold (first use, including model loading) and warm latency per
+    stage, end to end throughput and peak RSS, and writes them as JSON so runs
+    can be compared, e.g. before and after a change or a spacy/model upgrade.
+
+    Usage:
+        python scripts/benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+
+
+def percentile(timings, percent):
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarise(timings, percents=(50, 95)):
+    """Summary statistics in milliseconds for a list of timings in seconds, with the given percentiles."""
+
+    timings_ms = [timing * 1000 for timing in timings]
+    summary = {'count': len(timings_ms), 'mean_ms': statistics.mean(timings_ms)}
+    for percent in percents:
+        summary[f'p{percent}_ms'] = percentile(timings_ms, percent)
+    summary['max_ms'] = max(timings_ms)
+
+    return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux and bytes on mac
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def timed(stage_timings, stage, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    stage_timings[stage].append(time.perf_counter() - start)
+    return result
+
+
+def run_stages(topic_labelling, docs, stage_timings):
+    """Run every document through the pipeline one stage at a time, timing each stage."""
+
+    from lda_inference import bow_matrix
+
+    vocabulary = topic_labelling.models.get('vocabulary')
+    lda_model = topic_labelling.models.get('lda_model')
+
+    for doc in docs:
+        normalised = timed(stage_timings, 'normalise_doc', topic_labelling.normalise_doc, doc)
+        spacy_processed = timed(stage_timings, 'spacy_process', topic_labelling.spacy_process, normalised)
+        ngram_computed = timed(stage_timings, 'compute_ngrams', topic_labelling.compute_ngrams, spacy_processed)
+        bow = timed(stage_timings, 'doc2bow', vocabulary.doc2bow, ngram_computed.split(" "))
+
+        doc_term = bow_matrix([bow], lda_model.num_terms)
+        topic_vector = timed(stage_timings, 'lda_inference', lda_model.topic_vectors, doc_term)[0]
+
+        timed(stage_timings, 'label_topic_vector', topic_labelling.label_topic_vector, topic_vector)
+
+
+def run_benchmark(model_path, fixtures_path, repeats):
+    config.local_model_path = model_path
+
+    with open(fixtures_path) as fixtures_file:
+        docs = [json.loads(line)['text'] for line in fixtures_file]
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True
+            ).stdout.strip(),
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'model_path': model_path,
+        'num_docs': len(docs),
+        'total_words': sum(len(doc.split()) for doc in docs),
+        'repeats': repeats,
+    }
+
+    # Cold start: importing the module, loading spacy and loading each model artifact
+    start = time.perf_counter()
+    import topic_labelling
+    cold = {'import_topic_labelling_ms': (time.perf_counter() - start) * 1000}
+
+    start = time.perf_counter()
+    topic_labelling.get_nlp()
+    cold['load_spacy_ms'] = (time.perf_counter() - start) * 1000
+
+    for name in topic_labelling.models.names():
+        start = time.perf_counter()
+        topic_labelling.models.get(name)
+        cold[f'load_{name}_ms'] = (time.perf_counter() - start) * 1000
+
+    # First pass over the documents is cold for spacy and numpy caches
+    cold_stage_timings = defaultdict(list)
+    run_stages(topic_labelling, docs[:1], cold_stage_timings)
+    cold['first_doc_stages_ms'] = {stage: timings[0] * 1000 for stage, timings in cold_stage_timings.items()}
+    results['cold'] = cold
+
+    warm_stage_timings = defaultdict(list)
+    for _ in range(repeats):
+        run_stages(topic_labelling, docs, warm_stage_timings)
+    results['warm_stages'] = {stage: summarise(timings) for stage, timings in warm_stage_timings.items()}
+
+    # End to end throughput, one document at a time and in batch
+    end_to_end_timings = defaultdict(list)
+    for _ in range(repeats):
+        for doc in docs:
+            timed(end_to_end_timings, 'assign_topic_labels', topic_labelling.assign_topic_labels, doc)
+    assign_timings = end_to_end_timings['assign_topic_labels']
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        topic_labelling.assign_topic_labels_batch(docs)
+    batch_seconds = time.perf_counter() - start
+
+    results['assign_topic_labels'] = summarise(assign_timings)
+    results['throughput_docs_per_sec'] = {
+        'assign_topic_labels': len(assign_timings) / sum(assign_timings),
+        'assign_topic_labels_batch': len(docs) * repeats / batch_seconds,
+    }
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    return results
+
+
+def print_results(results, baseline=None):
+    def compared(value, baseline_value):
+        if baseline_value:
+            return f"{value:10.2f}  ({value / baseline_value:5.2f}x baseline)"
+        return f"{value:10.2f}"
+
+    baseline = baseline or {}
+    print(f"Benchmark of {results['num_docs']} documents x {results['repeats']} repeats at {results['git_commit']}")
+
+    print("\nCold start (ms)")
+    for key, value in results['cold'].items():
+        if isinstance(value, dict):
+            continue
+        print(f"  {key:40}{compared(value, baseline.get('cold', {}).get(key))}")
+
+    print("\nWarm stage latency per document, mean ms")
+    for stage, summary in results['warm_stages'].items():
+        baseline_mean = baseline.get('warm_stages', {}).get(stage, {}).get('mean_ms')
+        print(f"  {stage:40}{compared(summary['mean_ms'], baseline_mean)}")
+
+    print("\nThroughput (docs/sec)")
+    for key, value in results['throughput_docs_per_sec'].items():
+        baseline_value = baseline.get('throughput_docs_per_sec', {}).get(key)
+        print(f"  {key:40}{compared(value, baseline_value)}")
+
+    print(f"\nPeak RSS (MB) {compared(results['peak_rss_mb'], baseline.get('peak_rss_mb'))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the topic labelling pipeline')
+    parser.add_argument('--model-path', default='models', help='Directory holding the model files')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles with a text field')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of warm passes over the articles')
+    parser.add_argument('--output', default='benchmark.json', help='File to write the results to as JSON')
+    parser.add_argument('--compare', help='Results JSON from an earlier run to compare against')
+    arguments = parser.parse_args()
+
+    results = run_benchmark(arguments.model_path, arguments.fixtures, arguments.repeats)
+
+    with open(arguments.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_results(results, baseline)
+    print(f"\nResults written to {arguments.output}")
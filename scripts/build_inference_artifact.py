@@ -0,0 +1,75 @@
+"""
+    Converts the LDA MALLET model into the inference artifact loaded by the lambda.
+
+    malletmodel2ldamodel is run once here instead of on every invocation, and
+    only what inference needs is saved next to the other models:
+
+    - lda_topic_word.npy: float64 (num_topics, num_terms) matrix of exp(E[log beta]),
+      the topic-word weights gensim's LdaModel uses for inference, at the
+      precision malletmodel2ldamodel converts them to
+    - lda_alpha.npy: float64 document-topic prior
+    - vocabulary_tokens.npy, vocabulary_ids.npy: the gensim dictionary's tokens,
+      sorted, and their int32 ids, so the pickled dictionary isn't loaded
+
+    With --precision, the topic-word matrix is also saved quantized, for the
+    lambda to load with LDA_TOPIC_WORD_PRECISION set:
+
+    - lda_topic_word_float16.npy or lda_topic_word_int8.npy: the quantized weights
+    - lda_topic_word_float16_scale.npy or lda_topic_word_int8_scale.npy: float32
+      (num_topics, 2) scale of each topic, see lda_inference.quantize_topic_word
+
+    Usage: python scripts/build_inference_artifact.py [model_dir] [--precision float16 int8]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.wrappers import LdaMallet, ldamallet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+from lda_inference import quantize_topic_word
+from vocabulary import Vocabulary
+
+
+def build_inference_artifact(model_path, precisions=()):
+    print(f"Converting LDA MALLET model in {model_path}")
+    lda_model_unconverted = LdaMallet.load(os.path.join(model_path, 'lda_model_mallet.model'))
+    lda_model = ldamallet.malletmodel2ldamodel(lda_model_unconverted)
+
+    topic_word = np.ascontiguousarray(lda_model.expElogbeta, dtype=np.float64)
+    alpha = np.asarray(lda_model.alpha, dtype=np.float64)
+
+    gensim_dictionary = Dictionary.load(os.path.join(model_path, 'gensim_dictionary'))
+    num_terms = topic_word.shape[1]
+
+    if max(gensim_dictionary.token2id.values()) >= num_terms:
+        raise ValueError("Dictionary has ids outside of the topic model's vocabulary")
+
+    vocabulary = Vocabulary.from_token2id(gensim_dictionary.token2id)
+
+    np.save(os.path.join(model_path, 'lda_topic_word.npy'), topic_word)
+    np.save(os.path.join(model_path, 'lda_alpha.npy'), alpha)
+    vocabulary.save(os.path.join(model_path, 'vocabulary_tokens.npy'), os.path.join(model_path, 'vocabulary_ids.npy'))
+
+    for precision in precisions:
+        codes, scale = quantize_topic_word(topic_word, precision)
+        np.save(os.path.join(model_path, f'lda_topic_word_{precision}.npy'), codes)
+        np.save(os.path.join(model_path, f'lda_topic_word_{precision}_scale.npy'), scale)
+        print(f"Saved {precision} topic-word matrix, {codes.nbytes / 2 ** 20:.1f}MB "
+              f"against {topic_word.nbytes / 2 ** 20:.1f}MB at float64")
+
+    print(f"Saved inference artifact: {topic_word.shape[0]} topics, {num_terms} terms, "
+          f"{len(vocabulary)} tokens of up to {vocabulary.tokens.dtype.itemsize // 4} characters")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the LDA inference artifact')
+    parser.add_argument('model_path', nargs='?', default='models',
+                        help='Directory holding lda_model_mallet.model and gensim_dictionary')
+    parser.add_argument('--precision', nargs='*', default=[], choices=['float16', 'int8'],
+                        help='Also save the topic-word matrix quantized to these precisions')
+    arguments = parser.parse_args()
+    build_inference_artifact(arguments.model_path, arguments.precision)
@@ -0,0 +1,58 @@
+"""
+    Freezes the trained gensim Phrases model (ngram_model.pkl) into a phrase
+    table holding only the accepted phrases, ngram_phrases.json, which is what
+    the lambda loads to compute ngrams.
+
+    The table is checked to give the same tokens as the Phrases model over the
+    fixture articles before it is saved.
+
+    Usage: python scripts/build_phrase_table.py [model_dir] [--fixtures fixtures/articles.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+from gensim.models.phrases import Phraser, Phrases
+from gensim.utils import to_unicode
+
+from phrase_table import PhraseTable
+from topic_labelling import normalise_doc, spacy_process
+
+
+def build_phrase_table(model_path, fixtures_path):
+    print(f"Freezing ngram model in {model_path}")
+    ngram_model = Phrases.load(os.path.join(model_path, 'ngram_model.pkl'))
+
+    # Phraser exports the phrases the Phrases model accepts, with their scores
+    phraser = Phraser(ngram_model)
+    phrase_table = PhraseTable(
+        [[to_unicode(token) for token in phrase] for phrase in phraser.phrasegrams],
+        [to_unicode(term) for term in phraser.common_terms],
+        to_unicode(phraser.delimiter)
+        )
+
+    with open(fixtures_path) as fixtures_file:
+        docs = [json.loads(line)['text'] for line in fixtures_file]
+
+    mismatches = 0
+    for doc in docs:
+        tokens = spacy_process(normalise_doc(doc)).split(" ")
+        if phrase_table.apply(tokens) != ngram_model[tokens]:
+            mismatches += 1
+
+    if mismatches:
+        sys.exit(f"Phrase table gives different tokens to the Phrases model for {mismatches} of {len(docs)} articles")
+
+    phrase_table.save(os.path.join(model_path, 'ngram_phrases.json'))
+    print(f"Saved phrase table with {len(phrase_table.phrases)} phrases, same tokens for {len(docs)} articles")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the ngram phrase table')
+    parser.add_argument('model_path', nargs='?', default='models', help='Directory holding ngram_model.pkl')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='Articles to check the table against')
+    arguments = parser.parse_args()
+    build_phrase_table(arguments.model_path, arguments.fixtures)
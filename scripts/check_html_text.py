@@ -0,0 +1,128 @@
+"""
+    Checks html_text's streaming extraction of article bodies over the CPS XML
+    and HTML samples in fixtures/html_bodies.jsonl, each with the text blocks
+    it should give: entities, <br>, captions, scripts, CPS images, video, lists
+    and links.
+
+    Every sample is also fed to the parser in chunks of 1 to 16 characters, and
+    a long generated body at the default chunk size, so entities and tags split
+    across chunk boundaries must give the same blocks as parsing in one go. If
+    BeautifulSoup is installed its text, with the same elements removed, is
+    compared too.
+
+    How the output differs from the regex tag stripping parse_article used
+    before is reported, those differences are the point of the change.
+
+    Usage: python scripts/check_html_text.py [fixtures/html_bodies.jsonl] [--verbose]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+from html_text import BLOCK_TAGS, FEED_CHUNK_SIZE, SKIPPED_TAGS, extract_text, extract_text_blocks
+
+LONG_BODY_PARAGRAPH = (
+    '<p>Fish &amp; chips &#8211; caf&eacute; prices<br/>rose <a href="/news">&pound;1</a></p>'
+    '<image id="1"><caption>Not prose</caption></image>'
+)
+
+
+def regex_text(markup):
+    """The body as parse_article extracted it before html_text, tags stripped by a regex."""
+
+    return re.sub('<[^<]+?>', '', markup)
+
+
+def beautifulsoup_blocks(markup):
+    """Blocks from BeautifulSoup with the skipped elements removed, None if it isn't installed."""
+
+    try:
+        from bs4 import BeautifulSoup
+        from bs4.builder import HTMLParserTreeBuilder
+    except ImportError:
+        return None
+
+    # BeautifulSoup takes <image> for the obsolete HTML alias of <img>, but a CPS <image> holds its caption
+    builder = HTMLParserTreeBuilder(empty_element_tags=HTMLParserTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS - {'image'})
+    soup = BeautifulSoup(markup, builder=builder)
+    for tag in soup.find_all(SKIPPED_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before('\n')
+        tag.insert_after('\n')
+
+    return lines(soup.get_text())
+
+
+def lines(text):
+    """Non blank lines of text with their whitespace collapsed, to compare blocks however they were split."""
+
+    return [' '.join(line.split()) for line in text.splitlines() if line.strip()]
+
+
+def check_html_text(samples_path, verbose=False):
+    with open(samples_path) as samples_file:
+        samples = [json.loads(line) for line in samples_file]
+
+    failures = []
+    regex_differences = []
+    compared_with_beautifulsoup = False
+
+    for sample in samples:
+        name, markup = sample['name'], sample['body']
+        blocks = list(extract_text_blocks(markup))
+
+        if blocks != sample['blocks']:
+            failures.append(f"{name}: blocks {blocks} expected {sample['blocks']}")
+
+        for chunk_size in range(1, 17):
+            chunked_blocks = list(extract_text_blocks(markup, chunk_size))
+            if chunked_blocks != blocks:
+                failures.append(f"{name}: in chunks of {chunk_size} blocks {chunked_blocks} expected {blocks}")
+                break
+
+        reference_blocks = beautifulsoup_blocks(markup)
+        if reference_blocks is not None:
+            compared_with_beautifulsoup = True
+            if reference_blocks != lines(extract_text(markup)):
+                failures.append(f"{name}: blocks {blocks} but BeautifulSoup gives {reference_blocks}")
+
+        old_text = ' '.join(regex_text(markup).split())
+        new_text = ' '.join(' '.join(blocks).split())
+        if old_text != new_text:
+            regex_differences.append((name, old_text, new_text))
+
+    long_body = LONG_BODY_PARAGRAPH * (3 * FEED_CHUNK_SIZE // len(LONG_BODY_PARAGRAPH))
+    if list(extract_text_blocks(long_body)) != list(extract_text_blocks(long_body, len(long_body))):
+        failures.append(f"Long body of {len(long_body)} characters parses differently in chunks of {FEED_CHUNK_SIZE}")
+
+    print(f"{len(regex_differences)} of {len(samples)} samples give different text to the old regex extraction"
+          f"{', --verbose to list them' if regex_differences and not verbose else ''}")
+    if verbose:
+        for name, old_text, new_text in regex_differences:
+            print(f"\n{name}:\n  regex:     {old_text!r}\n  html_text: {new_text!r}")
+
+    if not compared_with_beautifulsoup:
+        print("BeautifulSoup isn't installed, not compared with it")
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(f"{len(failures)} problems with the text extracted")
+
+    print(f"Text blocks as expected for {len(samples)} samples and a {len(long_body)} character body, "
+          f"however they are split into chunks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the text extracted from CPS XML and HTML bodies')
+    parser.add_argument('samples_path', nargs='?', default='fixtures/html_bodies.jsonl',
+                        help='JSONL of samples with name, body and the blocks expected')
+    parser.add_argument('--verbose', action='store_true', help='Show the text the old regex extraction gave')
+    arguments = parser.parse_args()
+
+    check_html_text(arguments.samples_path, arguments.verbose)
@@ -0,0 +1,86 @@
+"""
+    Checks importing the lambda module stays within the import time budget
+    (config.import_time_budget_ms) and doesn't load the heavy dependencies
+    that are only needed once an event has been checked, e.g. spacy and boto3.
+
+    The module is imported in a fresh interpreter with python -X importtime,
+    the slowest imports are listed, and the check fails if the budget is
+    exceeded or a deferred dependency is imported.
+
+    Usage: python scripts/check_import_time.py [--module lambda_function] [--budget-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')
+sys.path.insert(0, SRC_PATH)
+
+import config
+
+# Imported when an event needs them, never on import of the lambda module
+DEFERRED_MODULES = ['boto3', 'botocore', 'emoji', 'en_core_web_sm', 'gensim', 'requests', 'scipy', 'slack', 'spacy']
+
+
+def profile_imports(module):
+    """Import module in a new interpreter, returning (module, cumulative microseconds, depth) for every import."""
+
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_PATH, capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        sys.exit(f'Importing {module} failed:\n{completed.stderr}')
+
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        # e.g. "import time:       766 |       1064 |   post_to_slack"
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(cumulative), depth))
+
+    return imports
+
+
+def check_import_time(module, budget_ms, top):
+    imports = profile_imports(module)
+
+    # The module's own cumulative time, leaving out interpreter start up, e.g. site
+    total_ms = next(cumulative for name, cumulative, depth in imports if name == module and depth == 0) / 1000
+
+    print(f'Slowest imports of {module}, cumulative ms')
+    for name, cumulative, depth in sorted(imports, key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f}  {'  ' * depth}{name}")
+
+    failures = []
+
+    imported = {name for name, _, _ in imports}
+    deferred_imported = [
+        name for name in DEFERRED_MODULES if name in imported or any(i.startswith(f'{name}.') for i in imported)
+    ]
+    if deferred_imported:
+        failures.append(f'{module} imports {deferred_imported} on import, they should be imported when first used')
+
+    print(f'\nImporting {module} took {total_ms:.1f}ms, budget {budget_ms:.1f}ms')
+    if total_ms > budget_ms:
+        failures.append(f'Importing {module} took {total_ms:.1f}ms, over the {budget_ms:.1f}ms budget')
+
+    if failures:
+        sys.exit('\n'.join(failures))
+
+    print('Import time within budget')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the import time of the lambda module')
+    parser.add_argument('--module', default='lambda_function', help='Module in src/ to import')
+    parser.add_argument('--budget-ms', type=float, default=config.import_time_budget_ms,
+                        help='Most milliseconds the import may take')
+    parser.add_argument('--top', type=int, default=15, help='Number of the slowest imports to list')
+    arguments = parser.parse_args()
+
+    check_import_time(arguments.module, arguments.budget_ms, arguments.top)
@@ -0,0 +1,102 @@
+"""
+    Checks the topic distributions from lda_inference.LdaInference match
+    gensim's LdaModel, converted from the MALLET model by malletmodel2ldamodel
+    exactly as the lambda used to, over the fixture articles and random bags of
+    words. Also checks the assigned labels are unchanged.
+
+    gensim is only needed for this check, the lambda no longer imports it.
+
+    Usage: python scripts/check_lda_inference.py --model-path models --random-docs 200
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from gensim.models.wrappers import LdaMallet, ldamallet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+
+
+def gensim_lda_model(model_path):
+    """The gensim LdaModel the lambda ran inference with before lda_inference, with malletmodel2ldamodel's defaults."""
+
+    lda_model_unconverted = LdaMallet.load(os.path.join(model_path, 'lda_model_mallet.model'))
+    return ldamallet.malletmodel2ldamodel(lda_model_unconverted)
+
+
+def random_bows(num_docs, num_terms, random_state):
+    bows = []
+    for _ in range(num_docs):
+        length = random_state.randint(0, 2000)
+        token_ids, counts = np.unique(random_state.randint(0, num_terms, length), return_counts=True)
+        bows.append((token_ids.astype(np.int32), counts.astype(np.int32)))
+
+    return bows
+
+
+def check_lda_inference(model_path, fixtures_path, random_docs, tolerance):
+    config.local_model_path = model_path
+
+    import topic_labelling
+    from lda_inference import bow_matrix
+
+    vocabulary = topic_labelling.models.get('vocabulary')
+    lda_inference = topic_labelling.models.get('lda_model')
+    lda_model = gensim_lda_model(model_path)
+
+    with open(fixtures_path) as fixtures_file:
+        articles = [json.loads(line) for line in fixtures_file]
+
+    bows = {
+        article['id']: vocabulary.doc2bow(topic_labelling.preprocess_document(article['text']))
+        for article in articles
+    }
+    for doc_num, bow in enumerate(random_bows(random_docs, lda_inference.num_terms, np.random.RandomState(0))):
+        bows[f'random-{doc_num}'] = bow
+
+    # One document at a time, as get_topic_vector, and all at once, as get_topic_distributions
+    batch_distributions = lda_inference.topic_distributions(bow_matrix(list(bows.values()), lda_inference.num_terms))
+
+    failures = 0
+    max_difference = 0
+    for (doc_id, bow), batch_distribution in zip(bows.items(), batch_distributions):
+        # As LdaModel[bow] did, with numpy's global random state seeded before each document
+        np.random.seed(100)
+        gamma, _ = lda_model.inference([list(zip(*(array.tolist() for array in bow)))])
+        expected = gamma[0] / gamma[0].sum()
+        expected_vector = [(topic_num, score) for topic_num, score in enumerate(expected) if score >= 0.01]
+
+        doc_term = bow_matrix([bow], lda_inference.num_terms)
+        distribution = lda_inference.topic_distributions(doc_term)[0]
+        difference = max(np.abs(distribution - expected).max(), np.abs(batch_distribution - expected).max())
+        max_difference = max(max_difference, difference)
+
+        expected_labels = topic_labelling.label_topic_vector(expected_vector)
+        labels = topic_labelling.label_topic_vector(lda_inference.topic_vectors(doc_term)[0])
+        labels_match = [label['name'] for label in labels] == [label['name'] for label in expected_labels]
+
+        if difference > tolerance or not labels_match:
+            failures += 1
+            print(f"{doc_id}: max difference {difference:.2e}, labels {labels} expected {expected_labels}")
+
+    print(f"Checked {len(bows)} documents, max difference in topic probability {max_difference:.2e}")
+    if failures:
+        sys.exit(f"{failures} documents differ from gensim")
+
+    print(f"Topic distributions within {tolerance} of gensim and labels identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare lda_inference with gensim LdaModel inference')
+    parser.add_argument('--model-path', default='models', help='Directory holding the model files')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles with a text field')
+    parser.add_argument('--random-docs', type=int, default=200, help='Number of random bags of words to check')
+    parser.add_argument('--tolerance', type=float, default=1e-4,
+                        help='Largest allowed difference in any topic probability')
+    arguments = parser.parse_args()
+
+    check_lda_inference(arguments.model_path, arguments.fixtures, arguments.random_docs, arguments.tolerance)
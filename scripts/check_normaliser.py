@@ -0,0 +1,65 @@
+"""
+    Checks normalise_doc gives exactly the same output as the original per word
+    regex implementation over the fixture articles and some awkward unicode text.
+
+    Usage: python scripts/check_normaliser.py [fixtures/articles.jsonl]
+"""
+import argparse
+import json
+import os
+import re
+import string
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+from topic_labelling import normalise_doc
+
+EDGE_CASES = [
+    '',
+    '   \n\t  ',
+    'COVID-19 cases rose 12.5% to 3,401 on 1st May.',
+    'Café, naïve and résumé – “quoted” ‘text’ … don’t',
+    'Kelvin K and dotted İstanbul',
+    'non breaking em thin　ideographic line para spaces',
+    'tabs\tnew\nlines\r\nform\x0cfeed\x1cfile\x1dgroup\x1erecord\x1funit separators',
+    'digits ٣٤٥ and ½ fractions ² superscripts',
+    'emoji 😷 and symbols £€$ @handle #tag https://www.bbc.co.uk/news',
+    '<p>left over</p> &amp; markup \\ back\\slash [brackets] {braces} ^caret^ `tick`',
+]
+
+
+def reference_normalise_doc(doc):
+    """normalise_doc as originally written, kept here as the reference output."""
+
+    punc = string.punctuation
+    doc = doc.lower()
+    cleaned_tokens = [re.sub(r'([^a-zA-Z ]+?)', '', re.sub(f'([\\d\\s{punc} ]+?)', '', token)) for token in doc.split()]
+
+    return ' '.join(list(filter(None, cleaned_tokens)))
+
+
+def check_normaliser(fixtures_path):
+    with open(fixtures_path) as fixtures_file:
+        docs = [json.loads(line)['text'] for line in fixtures_file]
+
+    docs += EDGE_CASES
+    # Every character on its own and inside a word
+    docs += [chr(code_point) + f'a{chr(code_point)}b' for code_point in range(sys.maxunicode + 1)]
+
+    mismatches = [doc for doc in docs if normalise_doc(doc) != reference_normalise_doc(doc)]
+
+    for doc in mismatches[:10]:
+        print(f"Mismatch for {doc[:80]!r}:\n  {reference_normalise_doc(doc)[:80]!r}\n  {normalise_doc(doc)[:80]!r}")
+
+    if mismatches:
+        sys.exit(f"{len(mismatches)} of {len(docs)} documents normalised differently")
+
+    print(f"normalise_doc output identical to the reference for {len(docs)} documents")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare normalise_doc with the original implementation')
+    parser.add_argument('fixtures_path', nargs='?', default='fixtures/articles.jsonl')
+    arguments = parser.parse_args()
+    check_normaliser(arguments.fixtures_path)
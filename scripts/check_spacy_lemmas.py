@@ -0,0 +1,46 @@
+"""
+    Checks the slimmed down spacy pipeline used by spacy_process gives the same
+    lemmas as the full en_core_web_sm pipeline over the fixture articles.
+
+    Usage: python scripts/check_spacy_lemmas.py [fixtures/articles.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import en_core_web_sm
+
+from topic_labelling import lemmatise, normalise_doc, spacy_process
+
+
+def check_spacy_lemmas(fixtures_path):
+    full_nlp = en_core_web_sm.load()
+
+    mismatches = 0
+    with open(fixtures_path) as fixtures_file:
+        for line in fixtures_file:
+            article = json.loads(line)
+            normalised = normalise_doc(article['text'])
+
+            expected = lemmatise(full_nlp(normalised)).split(" ")
+            actual = spacy_process(normalised).split(" ")
+
+            if actual != expected:
+                mismatches += 1
+                differences = [(e, a) for e, a in zip(expected, actual) if e != a]
+                print(f"{article['id']}: lemmas differ, first differences {differences[:10]}")
+
+    if mismatches:
+        sys.exit(f"{mismatches} articles have different lemmas")
+
+    print("Lemmas identical to the full spacy pipeline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare slim and full spacy pipeline lemmas')
+    parser.add_argument('fixtures_path', nargs='?', default='fixtures/articles.jsonl')
+    arguments = parser.parse_args()
+    check_spacy_lemmas(arguments.fixtures_path)
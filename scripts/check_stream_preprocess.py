@@ -0,0 +1,105 @@
+"""
+    Checks preprocess_document_stream, used for articles over
+    config.stream_document_chars, against preprocess_document.
+
+    Each fixture article is split into chunks (of a chunk size small enough to
+    split every article) and normalising the chunks one by one must give the
+    same words as normalising the article whole. The article is then
+    preprocessed whole and in chunks and the labels of both are compared, as
+    chunk boundaries can change the odd spacy lemma. Then the fixtures are
+    joined into one long article to compare the peak memory of the two, with
+    the configured config.stream_chunk_chars.
+
+    Usage: python scripts/check_stream_preprocess.py --model-path models [--chunk-chars 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+
+
+def peak_memory_mb(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def check_stream_preprocess(model_path, fixtures_path, chunk_chars, long_article_chars):
+    config.local_model_path = model_path
+    configured_chunk_chars = config.stream_chunk_chars
+    config.stream_chunk_chars = chunk_chars
+
+    import topic_labelling
+    topic_labelling.initialise()
+
+    with open(fixtures_path) as fixtures_file:
+        articles = [json.loads(line) for line in fixtures_file]
+
+    mismatches = 0
+    changed_tokens = 0
+    split_words = 0
+    boundaries = 0
+    for article in articles:
+        chunks = list(topic_labelling.document_chunks(article['text']))
+        if len(chunks) < 2:
+            sys.exit(f"{article['id']} isn't split in chunks of {chunk_chars} characters, pass a smaller --chunk-chars")
+        boundaries += len(chunks) - 1
+        chunk_words = ' '.join(topic_labelling.normalise_doc(chunk) for chunk in chunks).split()
+        whole_words = topic_labelling.normalise_doc(article['text']).split()
+        if chunk_words != whole_words:
+            split_words += 1
+            print(f"{article['id']}: normalising its {len(chunks)} chunks gives different words to the whole article")
+
+        whole_counts = Counter(topic_labelling.preprocess_document(article['text']))
+        stream_counts = topic_labelling.preprocess_document_stream(article['text'])
+        changed_tokens += sum(((whole_counts - stream_counts) + (stream_counts - whole_counts)).values())
+
+        expected = topic_labelling.label_topic_vector(topic_labelling.get_topic_vector_from_counts(whole_counts))
+        labels = topic_labelling.label_topic_vector(topic_labelling.get_topic_vector_from_counts(stream_counts))
+        if [label['name'] for label in labels] != [label['name'] for label in expected]:
+            mismatches += 1
+            print(f"{article['id']}: labels {labels} expected {expected}")
+
+    print(f"Checked {len(articles)} articles in chunks of {chunk_chars} characters, {boundaries} chunk boundaries, "
+          f"{changed_tokens} token counts changed by chunking")
+
+    # One long article made of the fixtures, in the configured chunk size, kept under
+    # spacy's max_length so it can be processed whole
+    long_article = '\n'.join(article['text'] for article in articles)
+    long_article = (long_article + '\n') * (long_article_chars // len(long_article) + 1)
+    long_article = long_article[:min(long_article_chars, topic_labelling.get_nlp().max_length - 1)]
+    config.stream_chunk_chars = configured_chunk_chars
+
+    whole_mb = peak_memory_mb(topic_labelling.preprocess_document, long_article)
+    stream_mb = peak_memory_mb(topic_labelling.preprocess_document_stream, long_article)
+    print(f"Peak memory preprocessing a {len(long_article)} character article: "
+          f"{whole_mb:.1f}MB whole, {stream_mb:.1f}MB in chunks")
+
+    if split_words:
+        sys.exit(f"{split_words} articles normalised differently in chunks")
+    if mismatches:
+        sys.exit(f"{mismatches} articles labelled differently in chunks")
+
+    print("Labels identical when preprocessed in chunks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare chunked and whole article preprocessing')
+    parser.add_argument('--model-path', default='models', help='Directory holding the model files')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles with a text field')
+    parser.add_argument('--chunk-chars', type=int, default=200, help='Chunk size to preprocess the fixtures in')
+    parser.add_argument('--long-article-chars', type=int, default=500000,
+                        help='Length of the article built from the fixtures to measure memory with')
+    arguments = parser.parse_args()
+
+    check_stream_preprocess(arguments.model_path, arguments.fixtures, arguments.chunk_chars,
+                            arguments.long_article_chars)
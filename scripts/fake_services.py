@@ -0,0 +1,360 @@
+"""
+    Local stand-ins for the services the lambda calls, so lambda_handler can be
+    run, and load tested with scripts/load_test.py, without network access or
+    credentials:
+
+    - CPS content API: GET /cms/cps/asset/<id> serves the fixture articles as
+      CPS assets, anything else is a 404
+    - Slack: POST /api/<method> (the web API, e.g. chat.postMessage) and
+      POST /slack/response/... (slash command response_urls) accept and count
+      messages
+    - S3: path style GET (with Range) and HEAD of objects and ListObjectsV2 of
+      the model bucket, which holds the files in the model directory under
+      models/ and as the models.zip archive
+
+    GET /_stats returns the number of requests made to each service.
+
+    Point the lambda at it with the environment variables it prints, e.g.
+
+    CPS_API_URL=http://127.0.0.1:8900/cms/cps/asset
+    SLACK_API_URL=http://127.0.0.1:8900/api/
+    S3_ENDPOINT_URL=http://127.0.0.1:8900
+
+    Usage: python scripts/fake_services.py --port 8900 [--model-path models] [--latency-ms 50]
+"""
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+
+CPS_PATH = '/cms/cps/asset/'
+SLACK_API_PATH = '/api/'
+SLACK_RESPONSE_PATH = '/slack/response/'
+
+# Keys the model files are served under in the bucket
+MODEL_PREFIX = 'models/'
+MODEL_ARCHIVE_KEY = 'models.zip'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+S3_XML_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+# The slack client needs the charset to decode responses
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+XML_CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+
+def service_environment(url: str) -> Dict[str, str]:
+    """Environment variables that point the lambda's CPS, slack and S3 clients at the fake services at url."""
+
+    return {
+        'CPS_API_URL': f'{url}{CPS_PATH.rstrip("/")}',
+        'CPS_API_KEY': 'fake-services',
+        'SLACK_API_URL': f'{url}{SLACK_API_PATH}',
+        'TOPIC_MODEL_SLACK_AUTH_TOKEN': 'fake-services',
+        'S3_ENDPOINT_URL': url,
+        'MODEL_BUCKET': config.model_bucket,
+        'MODEL_ZIP_S3_KEY': MODEL_ARCHIVE_KEY,
+        # boto3 signs requests so needs credentials, the fake doesn't check them
+        'AWS_ACCESS_KEY_ID': 'fake-services',
+        'AWS_SECRET_ACCESS_KEY': 'fake-services',
+        'AWS_DEFAULT_REGION': 'eu-west-1',
+    }
+
+
+def cps_asset(article: Dict[str, str]) -> Dict:
+    """A fixture article as a CPS asset response, the body as HTML paragraphs."""
+
+    title = article['title']
+    body_text = article['text'][len(title):] if article['text'].startswith(title) else article['text']
+    paragraphs = [paragraph.strip() for paragraph in body_text.split('\n') if paragraph.strip()]
+
+    return {'results': [{
+        'title': title,
+        'summary': '',
+        'body': ''.join(f'<p>{escape(paragraph)}</p>' for paragraph in paragraphs),
+    }]}
+
+
+class FakeServices(ThreadingHTTPServer):
+    """HTTP server for the fake CPS, slack and S3 services, see the module docstring.
+
+    Args:
+        server_address: (host, port) to listen on, port 0 for any free port.
+        model_path: Directory of model files served from the model bucket.
+        fixtures_path: JSONL of articles with id, title and text fields served by the CPS API.
+        latency_ms: Milliseconds the CPS and slack responses are delayed by, to mimic the network.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, model_path: str, fixtures_path: str, latency_ms: float = 0):
+        super().__init__(server_address, FakeServicesHandler)
+        self.model_path = model_path
+        self.latency_ms = latency_ms
+        self.bucket = config.model_bucket
+
+        with open(fixtures_path) as fixtures_file:
+            self.articles = {article['id']: article for article in map(json.loads, fixtures_file)}
+
+        self.objects: Dict[str, str] = {
+            f'{MODEL_PREFIX}{filename}': os.path.join(model_path, filename)
+            for filename in sorted(os.listdir(model_path))
+            if os.path.isfile(os.path.join(model_path, filename)) and not filename.startswith('.')
+        }
+        self._archive_dir = tempfile.TemporaryDirectory()
+        self._archive_lock = threading.Lock()
+
+        self.requests = Counter()
+        self._requests_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, service: str):
+        with self._requests_lock:
+            self.requests[service] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._requests_lock:
+            return dict(self.requests)
+
+    def object_path(self, key: str) -> Optional[str]:
+        if key == MODEL_ARCHIVE_KEY:
+            return self.model_archive()
+
+        return self.objects.get(key)
+
+    def model_archive(self) -> str:
+        """Path of the models.zip archive of the model files, built on first request."""
+
+        path = os.path.join(self._archive_dir.name, MODEL_ARCHIVE_KEY)
+        with self._archive_lock:
+            if not os.path.exists(path):
+                with zipfile.ZipFile(f'{path}.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for key, object_path in self.objects.items():
+                        archive.write(object_path, key[len(MODEL_PREFIX):])
+                os.rename(f'{path}.tmp', path)
+
+        return path
+
+    def server_close(self):
+        super().server_close()
+        self._archive_dir.cleanup()
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path, query = self.split_path()
+
+        if path == '/_stats':
+            self.send_body(200, json.dumps(self.server.stats()).encode('utf-8'), JSON_CONTENT_TYPE)
+        elif path.startswith(CPS_PATH):
+            self.get_cps_asset(path[len(CPS_PATH):])
+        else:
+            self.s3_request(path, query, include_body=True)
+
+    def do_HEAD(self):
+        path, query = self.split_path()
+        self.s3_request(path, query, include_body=False)
+
+    def do_POST(self):
+        path, _ = self.split_path()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if path.startswith(SLACK_API_PATH):
+            self.post_slack_api(path[len(SLACK_API_PATH):], body)
+        elif path.startswith(SLACK_RESPONSE_PATH):
+            self.server.count('slack_response_url')
+            self.delay()
+            self.send_body(200, b'ok', TEXT_CONTENT_TYPE)
+        else:
+            self.send_body(404, b'Not found', TEXT_CONTENT_TYPE)
+
+    def split_path(self) -> Tuple[str, Dict[str, str]]:
+        parsed = urllib.parse.urlsplit(self.path)
+        return urllib.parse.unquote(parsed.path), dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+
+    def delay(self):
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+    def get_cps_asset(self, asset_id: str):
+        self.server.count('cps')
+        self.delay()
+
+        article = self.server.articles.get(asset_id)
+        if article is None:
+            self.send_body(404, json.dumps({'error': f'No asset {asset_id}'}).encode('utf-8'), JSON_CONTENT_TYPE)
+            return
+
+        self.send_body(200, json.dumps(cps_asset(article)).encode('utf-8'), JSON_CONTENT_TYPE)
+
+    def post_slack_api(self, method: str, body: bytes):
+        self.server.count(f'slack_{method}')
+        self.delay()
+
+        response = {'ok': True}
+        if method == 'chat.postMessage':
+            try:
+                response['channel'] = json.loads(body or b'{}').get('channel')
+            except ValueError:
+                pass
+            response['ts'] = f'{time.time():.6f}'
+
+        self.send_body(200, json.dumps(response).encode('utf-8'), JSON_CONTENT_TYPE)
+
+    def s3_request(self, path: str, query: Dict[str, str], include_body: bool):
+        self.server.count('s3')
+
+        bucket, _, key = path.lstrip('/').partition('/')
+        if bucket != self.server.bucket:
+            self.send_s3_error(404, 'NoSuchBucket', f'No bucket {bucket}', include_body)
+        elif not key and query.get('list-type') == '2':
+            self.list_objects(query)
+        elif not key:
+            self.send_s3_error(400, 'NotImplemented', 'Only ListObjectsV2 is supported', include_body)
+        else:
+            self.get_object(key, include_body)
+
+    def list_objects(self, query: Dict[str, str]):
+        prefix = query.get('prefix', '')
+        url_encoded = query.get('encoding-type') == 'url'
+
+        def encode(value):
+            return urllib.parse.quote(value, safe='/') if url_encoded else value
+
+        keys = [key for key in [MODEL_ARCHIVE_KEY, *self.server.objects] if key.startswith(prefix)]
+        contents = []
+        for key in keys:
+            stat = os.stat(self.server.object_path(key))
+            contents.append(
+                f'<Contents><Key>{escape(encode(key))}</Key>'
+                f'<LastModified>{time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(stat.st_mtime))}</LastModified>'
+                f'<ETag>&quot;{object_etag(stat)}&quot;</ETag><Size>{stat.st_size}</Size>'
+                f'<StorageClass>STANDARD</StorageClass></Contents>'
+            )
+
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<ListBucketResult xmlns="{S3_XML_NAMESPACE}"><Name>{escape(self.server.bucket)}</Name>'
+            f'<Prefix>{escape(encode(prefix))}</Prefix><KeyCount>{len(keys)}</KeyCount><MaxKeys>1000</MaxKeys>'
+            f'{"<EncodingType>url</EncodingType>" if url_encoded else ""}<IsTruncated>false</IsTruncated>'
+            f'{"".join(contents)}</ListBucketResult>'
+        )
+        self.send_body(200, body.encode('utf-8'), XML_CONTENT_TYPE)
+
+    def get_object(self, key: str, include_body: bool):
+        path = self.server.object_path(key)
+        if path is None:
+            self.send_s3_error(404, 'NoSuchKey', f'No key {key}', include_body)
+            return
+
+        stat = os.stat(path)
+        start, end, status = 0, stat.st_size - 1, 200
+
+        range_match = RANGE_PATTERN.match(self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), stat.st_size - 1)
+            if start > end:
+                self.send_s3_error(416, 'InvalidRange', f'Range not satisfiable for {key}', include_body)
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', f'"{object_etag(stat)}"')
+        self.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+        self.end_headers()
+
+        if include_body:
+            with open(path, 'rb') as object_file:
+                object_file.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    chunk = object_file.read(min(remaining, 1024 * 1024))
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+    def send_s3_error(self, status: int, code: str, message: str, include_body: bool):
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+        ).encode('utf-8')
+        self.send_body(status, body if include_body else b'', XML_CONTENT_TYPE, content_length=len(body))
+
+    def send_body(self, status: int, body: bytes, content_type: str, content_length: Optional[int] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body) if content_length is None else content_length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def object_etag(stat) -> str:
+    return hashlib.md5(f'{stat.st_size}-{stat.st_mtime_ns}'.encode('utf-8')).hexdigest()
+
+
+def start_fake_services(host: str, port: int, model_path: str, fixtures_path: str,
+                        latency_ms: float = 0) -> FakeServices:
+    """Start the fake services on a background thread, returning the server."""
+
+    server = FakeServices((host, port), model_path, fixtures_path, latency_ms)
+    threading.Thread(target=server.serve_forever, name='fake-services', daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve local stand-ins for CPS, slack and S3')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--model-path', default='models', help='Directory of model files served from S3')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles served from CPS')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='Milliseconds CPS and slack responses are delayed by')
+    arguments = parser.parse_args()
+
+    server = FakeServices((arguments.host, arguments.port), arguments.model_path, arguments.fixtures,
+                          arguments.latency_ms)
+
+    print(f'Serving fake CPS, slack and S3 on {server.url}, point the lambda at it with:\n')
+    for name, value in service_environment(server.url).items():
+        print(f'export {name}={value}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
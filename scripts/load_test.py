@@ -0,0 +1,204 @@
+"""
+    Load tests lambda_handler end to end against the local stand-ins for CPS,
+    slack and S3 in scripts/fake_services.py.
+
+    Slash command events like events/event_slack_body.json are replayed at the
+    given concurrency, asking for the fixture articles in turn, with their
+    response_url pointed at the fake slack. The first event is run on its own
+    and reported as the cold start, as it downloads the models from the fake S3
+    and loads them. The rest report throughput and latency percentiles, and the
+    results are written as JSON so runs can be compared, as scripts/benchmark.py.
+
+    The handler is run on threads in this process, sharing one warm container's
+    module level state, as the labelling server would.
+
+    Usage:
+        python scripts/load_test.py --requests 200 --concurrency 8 --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+from benchmark import summarise
+from fake_services import SLACK_RESPONSE_PATH, service_environment, start_fake_services
+
+# Latency percentiles reported, the tail matters more under load than for the stage benchmarks
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+def use_fake_services(url, work_dir, cache):
+    """Point the lambda at the fake services at url, with the models downloaded to and cached in work_dir."""
+
+    for name, value in service_environment(url).items():
+        os.environ[name] = value
+        # config has already read the environment, so its settings are overridden directly.
+        # The lambda's modules read config when it's used, so this works whenever they were imported
+        if hasattr(config, name.lower()):
+            setattr(config, name.lower(), value)
+
+    config.download_models = True
+    config.local_model_path = os.path.join(work_dir, 'models')
+    config.cache_dir = os.path.join(work_dir, 'cache')
+    config.metrics_enabled = False
+
+    if not cache:
+        config.cache_dir = ''
+        config.cache_max_entries = 0
+
+
+def slack_events(event_path, article_ids, url, count):
+    """count slash command events based on the one in event_path, asking for each of article_ids in turn."""
+
+    with open(event_path) as event_file:
+        template = event_file.read()
+    body = dict(pair.split('=') for pair in json.loads(template)['slack-body'].split('&'))
+
+    events = []
+    for event_num in range(count):
+        body['text'] = article_ids[event_num % len(article_ids)]
+        body['response_url'] = urllib.parse.quote(f'{url}{SLACK_RESPONSE_PATH}{event_num}', safe='')
+        events.append({'slack-body': '&'.join(f'{name}={value}' for name, value in body.items())})
+
+    return events
+
+
+def run_event(lambda_function, event):
+    """Run the handler on event, returning (seconds taken, whether it succeeded)."""
+
+    start = time.perf_counter()
+    try:
+        response = lambda_function.lambda_handler(event, None)
+    except Exception:
+        response = None
+
+    # The handler reports errors to slack and returns None rather than raising
+    return time.perf_counter() - start, bool(response) and response.get('statusCode') == 200
+
+
+def run_load_test(model_path, fixtures_path, event_path, requests, concurrency, distinct_ids, latency_ms,
+                  fake_url=None, cache=True, verbose=False):
+    fake_services = None
+    if fake_url is None:
+        fake_services = start_fake_services('127.0.0.1', 0, model_path, fixtures_path, latency_ms)
+        fake_url = fake_services.url
+
+    with open(fixtures_path) as fixtures_file:
+        article_ids = [json.loads(line)['id'] for line in fixtures_file][:distinct_ids]
+
+    work_dir = tempfile.TemporaryDirectory()
+    use_fake_services(fake_url, work_dir.name, cache)
+
+    # The handler prints the labels of every article
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    try:
+        with output:
+            import lambda_function
+            cold_event, *events = slack_events(event_path, article_ids, fake_url, requests + 1)
+
+            cold_seconds, cold_succeeded = run_event(lambda_function, cold_event)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(lambda event: run_event(lambda_function, event), events))
+            wall_seconds = time.perf_counter() - start
+
+        timings = [seconds for seconds, _ in outcomes]
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_commit': subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True
+                ).stdout.strip(),
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'requests': requests,
+            'concurrency': concurrency,
+            'distinct_ids': len(article_ids),
+            'service_latency_ms': latency_ms if fake_services else None,
+            'cache': cache,
+            'cold_start_ms': cold_seconds * 1000,
+            'errors': int(not cold_succeeded) + sum(not succeeded for _, succeeded in outcomes),
+            'wall_seconds': wall_seconds,
+            'throughput_per_sec': requests / wall_seconds,
+            'latency': summarise(timings, LATENCY_PERCENTILES),
+        }
+        if fake_services:
+            results['service_requests'] = fake_services.stats()
+
+        return results
+    finally:
+        if fake_services:
+            fake_services.shutdown()
+            fake_services.server_close()
+        work_dir.cleanup()
+
+
+def print_results(results, baseline=None):
+    def compared(value, baseline_value):
+        if baseline_value:
+            return f"{value:10.2f}  ({value / baseline_value:5.2f}x baseline)"
+        return f"{value:10.2f}"
+
+    baseline = baseline or {}
+    print(f"Load test of {results['requests']} slack commands at concurrency {results['concurrency']}, "
+          f"{results['distinct_ids']} distinct articles, at {results['git_commit']}")
+
+    print(f"\n  {'cold_start_ms':40}{compared(results['cold_start_ms'], baseline.get('cold_start_ms'))}")
+    print(f"  {'throughput_per_sec':40}{compared(results['throughput_per_sec'], baseline.get('throughput_per_sec'))}")
+
+    print("\nLatency (ms)")
+    for key, value in results['latency'].items():
+        if key == 'count':
+            continue
+        print(f"  {key:40}{compared(value, baseline.get('latency', {}).get(key))}")
+
+    print(f"\nErrors {results['errors']}")
+    if 'service_requests' in results:
+        print(f"Requests to the fake services {results['service_requests']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test lambda_handler against fake CPS, slack and S3')
+    parser.add_argument('--model-path', default='models', help='Directory of model files served from the fake S3')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles served from CPS')
+    parser.add_argument('--event', default='events/event_slack_body.json', help='Slash command event to replay')
+    parser.add_argument('--requests', type=int, default=100, help='Number of events to replay after the cold start')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of events handled at once')
+    parser.add_argument('--distinct-ids', type=int, default=None,
+                        help='Number of the fixture articles asked for, all of them by default')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='Milliseconds the fake CPS and slack responses are delayed by')
+    parser.add_argument('--fake-url', help='URL of fake services already running, rather than starting them')
+    parser.add_argument('--no-cache', action='store_true', help='Turn off the article and label caches')
+    parser.add_argument('--verbose', action='store_true', help="Show the handler's output")
+    parser.add_argument('--output', default='load_test.json', help='File to write the results to as JSON')
+    parser.add_argument('--compare', help='Results JSON from an earlier run to compare against')
+    arguments = parser.parse_args()
+
+    results = run_load_test(
+        arguments.model_path, arguments.fixtures, arguments.event, arguments.requests, arguments.concurrency,
+        arguments.distinct_ids, arguments.latency_ms, arguments.fake_url, not arguments.no_cache, arguments.verbose
+        )
+
+    with open(arguments.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_results(results, baseline)
+    print(f"\nResults written to {arguments.output}")
@@ -0,0 +1,162 @@
+"""
+    Reports how the quantized topic-word matrices, see LDA_TOPIC_WORD_PRECISION,
+    change the labels assigned compared with the full precision float64 matrix.
+
+    The fixture articles are preprocessed once and, as there are only a few of
+    them, documents sampled from the model itself are added: each draws its
+    topic mixture from alpha and its words from those topics. Every document is
+    then run through inference and labelling with the matrix at each precision,
+    quantized in memory as scripts/build_inference_artifact.py would save it.
+
+    For each precision the size of the matrix, the share of documents given
+    exactly the same labels as at float64, the largest and mean difference in
+    any topic probability, and the time to infer the batch are reported.
+
+    Usage: python scripts/quantization_report.py --model-path models --sampled-docs 500 --min-agreement 0.99
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src'))
+
+import config
+
+
+def sampled_bows(num_docs, topic_word, alpha, random_state):
+    """Bags of words drawn from the model's generative process, 50 to 2000 tokens long."""
+
+    topic_term_cdf = np.cumsum(topic_word, axis=1, dtype=np.float64)
+    topic_term_cdf /= topic_term_cdf[:, -1:]
+
+    bows = []
+    for _ in range(num_docs):
+        topic_counts = random_state.multinomial(random_state.randint(50, 2000), random_state.dirichlet(alpha))
+        term_ids = np.concatenate([
+            np.searchsorted(topic_term_cdf[topic_num], random_state.random_sample(count), side='right')
+            for topic_num, count in enumerate(topic_counts) if count
+        ])
+        token_ids, counts = np.unique(np.minimum(term_ids, topic_word.shape[1] - 1), return_counts=True)
+        bows.append((token_ids.astype(np.int32), counts.astype(np.int32)))
+
+    return bows
+
+
+def timed_distributions(engine, doc_term, repeats):
+    """Topic distributions of the documents in doc_term and the fastest of repeats runs in seconds."""
+
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        distributions = engine.topic_distributions(doc_term)
+        seconds.append(time.perf_counter() - start)
+
+    return distributions, min(seconds)
+
+
+def quantization_report(model_path, fixtures_path, sampled_docs, repeats):
+    config.local_model_path = model_path
+    # The float64 matrix is the reference, whatever the environment sets
+    config.lda_topic_word_precision = 'float64'
+    config.metrics_enabled = False
+    # Not a warning for every document given no labels
+    config.log_level = 'ERROR'
+
+    import topic_labelling
+    from lda_inference import LdaInference, bow_matrix, quantize_topic_word
+
+    vocabulary = topic_labelling.models.get('vocabulary')
+    full_engine = topic_labelling.models.get('lda_model')
+    topic_word = np.asarray(full_engine.topic_word)
+
+    with open(fixtures_path) as fixtures_file:
+        articles = [json.loads(line) for line in fixtures_file]
+
+    bows = [vocabulary.doc2bow(tokens) for tokens in topic_labelling.preprocess_documents(
+        article['text'] for article in articles
+        )]
+    bows += sampled_bows(sampled_docs, topic_word, full_engine.alpha, np.random.RandomState(0))
+    doc_term = bow_matrix(bows, full_engine.num_terms)
+
+    full_distributions, full_seconds = timed_distributions(full_engine, doc_term, repeats)
+    full_labels = topic_labelling.label_topic_distributions(full_distributions)
+
+    results = {'float64': {
+        'matrix_mb': topic_word.nbytes / 2 ** 20, 'label_agreement': 1.0,
+        'max_difference': 0.0, 'mean_difference': 0.0, 'inference_seconds': full_seconds,
+    }}
+    disagreements = {}
+
+    for precision in ['float16', 'int8']:
+        codes, scale = quantize_topic_word(topic_word, precision)
+        engine = LdaInference(
+            codes, full_engine.alpha, iterations=full_engine.iterations, gamma_threshold=full_engine.gamma_threshold,
+            minimum_probability=full_engine.minimum_probability, topic_scale=scale
+            )
+
+        distributions, seconds = timed_distributions(engine, doc_term, repeats)
+        labels = topic_labelling.label_topic_distributions(distributions)
+        differences = np.abs(distributions - full_distributions)
+
+        agreeing = 0
+        disagreements[precision] = []
+        for doc_num, (doc_labels, doc_full_labels) in enumerate(zip(labels, full_labels)):
+            if [label['name'] for label in doc_labels] == [label['name'] for label in doc_full_labels]:
+                agreeing += 1
+            else:
+                doc_id = articles[doc_num]['id'] if doc_num < len(articles) else f'sampled-{doc_num - len(articles)}'
+                disagreements[precision].append((doc_id, doc_labels, doc_full_labels))
+
+        results[precision] = {
+            'matrix_mb': (codes.nbytes + scale.nbytes) / 2 ** 20, 'label_agreement': agreeing / len(bows),
+            'max_difference': float(differences.max()), 'mean_difference': float(differences.mean()),
+            'inference_seconds': seconds,
+        }
+
+    return len(articles), len(bows), results, disagreements
+
+
+def print_report(num_articles, num_docs, results, disagreements, verbose=False):
+    print(f"Labels of {num_articles} fixture articles and {num_docs - num_articles} sampled documents "
+          f"with the topic-word matrix at each precision\n")
+    print(f"  {'precision':10}{'matrix MB':>12}{'labels same':>14}{'max diff':>12}{'mean diff':>12}{'infer ms':>12}")
+    for precision, result in results.items():
+        print(f"  {precision:10}{result['matrix_mb']:12.1f}{result['label_agreement']:14.2%}"
+              f"{result['max_difference']:12.2e}{result['mean_difference']:12.2e}"
+              f"{result['inference_seconds'] * 1000:12.1f}")
+
+    for precision, precision_disagreements in disagreements.items():
+        if verbose or not precision_disagreements:
+            continue
+        print(f"\n{precision}: {len(precision_disagreements)} documents labelled differently, --verbose to list them")
+
+    if verbose:
+        for precision, precision_disagreements in disagreements.items():
+            for doc_id, labels, full_labels in precision_disagreements:
+                print(f"\n{precision} {doc_id}: {labels}\n  float64: {full_labels}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare labels from the quantized topic-word matrices with float64')
+    parser.add_argument('--model-path', default='models', help='Directory holding the model files')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles with a text field')
+    parser.add_argument('--sampled-docs', type=int, default=500,
+                        help='Number of documents sampled from the model to label as well as the fixtures')
+    parser.add_argument('--repeats', type=int, default=3, help='Times inference is run, the fastest is reported')
+    parser.add_argument('--min-agreement', type=float, default=0,
+                        help='Exit with an error if a precision gives the same labels for fewer of the documents')
+    parser.add_argument('--verbose', action='store_true', help='List the documents labelled differently')
+    arguments = parser.parse_args()
+
+    report = quantization_report(arguments.model_path, arguments.fixtures, arguments.sampled_docs, arguments.repeats)
+    print_report(*report, verbose=arguments.verbose)
+
+    below = [
+        precision for precision, result in report[2].items() if result['label_agreement'] < arguments.min_agreement
+    ]
+    if below:
+        sys.exit(f"Labels agree with float64 for fewer than {arguments.min_agreement:.2%} of documents at {below}")
@@ -0,0 +1,125 @@
+"""
+    Measures what the scheduled warm-up buys, by replaying
+    events/event_schedule.json against the lambda handler using the models in
+    models/.
+
+    Two fresh interpreters each stand in for a new lambda container:
+    - cold: the first fixture article is labelled straight away, as a slack
+      command arriving at a new container would be
+    - warm: the schedule event is replayed first, then the article is labelled
+
+    The schedule event is also replayed against the warm container a few more
+    times, to show what a warm-up costs once the container is already warm.
+    Articles are labelled with assign_topic_labels, as the handler does once it
+    has the article content, so no CPS key is needed.
+
+    Usage: python scripts/simulate_warmup.py --repeats 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT_PATH, 'src'))
+
+
+def run_container(mode, model_path, fixtures_path, event_path, repeats):
+    """Run in a fresh interpreter: optionally warm up, then label an article, printing the timings as JSON."""
+
+    import config
+    config.local_model_path = model_path
+    config.download_models = False
+
+    with open(event_path) as event_file:
+        schedule_event = json.load(event_file)
+    with open(fixtures_path) as fixtures_file:
+        article_text = json.loads(fixtures_file.readline())['text']
+
+    timings = {}
+
+    start = time.perf_counter()
+    import lambda_function
+    timings['import_ms'] = (time.perf_counter() - start) * 1000
+
+    if mode == 'warm':
+        start = time.perf_counter()
+        response = lambda_function.lambda_handler(schedule_event, None)
+        timings['first_warm_up_ms'] = (time.perf_counter() - start) * 1000
+
+        if response.get('statusCode') != 200:
+            sys.exit(f'Warm-up failed: {response}')
+
+        repeat_timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            lambda_function.lambda_handler(schedule_event, None)
+            repeat_timings.append((time.perf_counter() - start) * 1000)
+        timings['repeat_warm_up_ms'] = repeat_timings
+
+    import topic_labelling
+    if mode == 'cold':
+        # As the handler does for a slack command, prepare the models before labelling
+        start = time.perf_counter()
+        topic_labelling.initialise()
+        timings['initialise_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    topic_labelling.assign_topic_labels(article_text)
+    timings['first_article_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    topic_labelling.assign_topic_labels(article_text)
+    timings['second_article_ms'] = (time.perf_counter() - start) * 1000
+
+    print(json.dumps(timings))
+
+
+def simulate(model_path, fixtures_path, event_path, repeats):
+    environment = {
+        **os.environ,
+        'METRICS_ENABLED': 'False',
+        'LOG_LEVEL': 'WARNING',
+    }
+
+    results = {}
+    for mode in ('cold', 'warm'):
+        completed = subprocess.run(
+            [sys.executable, __file__, '--container', mode, '--model-path', model_path,
+             '--fixtures', fixtures_path, '--event', event_path, '--repeats', str(repeats)],
+            env=environment, capture_output=True, text=True
+            )
+        if completed.returncode != 0:
+            sys.exit(f'{mode} container failed:\n{completed.stderr}')
+        results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    cold, warm = results['cold'], results['warm']
+    print(f"Cold container, first article labelled after    {cold['initialise_ms'] + cold['first_article_ms']:8.1f}ms"
+          f" (of which loading {cold['initialise_ms']:.1f}ms)")
+    print(f"Warmed container, first article labelled after  {warm['first_article_ms']:8.1f}ms")
+    print(f"Warm article for comparison                     {warm['second_article_ms']:8.1f}ms")
+    print(f"\nFirst warm-up on a new container                {warm['first_warm_up_ms']:8.1f}ms")
+    if warm['repeat_warm_up_ms']:
+        print(f"Warm-up on an already warm container, mean      "
+              f"{sum(warm['repeat_warm_up_ms']) / len(warm['repeat_warm_up_ms']):8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the effect of the scheduled warm-up on labelling latency')
+    parser.add_argument('--model-path', default='models', help='Directory holding the model files')
+    parser.add_argument('--fixtures', default='fixtures/articles.jsonl', help='JSONL of articles with a text field')
+    parser.add_argument('--event', default='events/event_schedule.json', help='Scheduled event to replay')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of times to replay the event once warm')
+    parser.add_argument('--container', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    model_path = os.path.abspath(arguments.model_path)
+    fixtures_path = os.path.abspath(arguments.fixtures)
+    event_path = os.path.abspath(arguments.event)
+
+    if arguments.container:
+        run_container(arguments.container, model_path, fixtures_path, event_path, arguments.repeats)
+    else:
+        simulate(model_path, fixtures_path, event_path, arguments.repeats)
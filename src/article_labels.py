@@ -0,0 +1,94 @@
+import logging
+import os
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import cps_client
+import metrics
+import model_fetcher
+from result_cache import article_cache, label_cache
+from topic_labelling import assign_topic_labels, models
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Getting articles and their topic labels, through the article and label
+    caches. Shared by the lambda and the labelling server.
+'''
+
+# Settings that change the labels the same model files give, so are part of the label cache key
+LABEL_SETTINGS = ('topic_score_threshold_low', 'topic_score_threshold_high', 'spacy_lemmatizer_mode')
+
+
+@metrics.timed('get_article_content')
+def get_article_content(article_id: str) -> Tuple[str, str]:
+    """Get the title and text content of an article from the cache or the CPS content API."""
+
+    cached_article = article_cache.get(article_id)
+    metrics.put_metric('article_cache_hit', int(cached_article is not None), 'Count')
+    if cached_article is not None:
+        logger.debug(f"Article {article_id} found in cache")
+        title, article_content = cached_article
+        return title, article_content
+
+    title, article_content = cps_client.get_client(os.environ['CPS_API_KEY']).get_article(article_id)
+    article_cache.put(article_id, [title, article_content])
+
+    return title, article_content
+
+
+def get_article_labels(
+        article_id: str, article_content: str, models_ready: Optional[Future] = None) -> List[Dict[str, Any]]:
+    """Get the topic labels for an article from the cache or by applying the model.
+
+    Labels are cached against the version of the model files and the
+    labelling settings, so retrained models or changed thresholds don't return
+    stale labels.
+
+    Args:
+        article_id: CPS asset id of the article.
+        article_content: Text of the article.
+        models_ready: If the models are still being downloaded and loaded, the
+            future doing it. It is only waited on if the labels aren't cached.
+    """
+
+    settings = label_settings()
+    version = model_version()
+    if version is not None:
+        article_labels = label_cache.get((article_id, version, settings))
+        if article_labels is not None:
+            metrics.put_metric('label_cache_hit', 1, 'Count')
+            logger.debug(f"Labels for article {article_id} found in cache")
+            return article_labels
+
+    metrics.put_metric('label_cache_hit', 0, 'Count')
+    if models_ready is not None:
+        models_ready.result()
+        # The models may only just have been downloaded
+        version = model_version()
+
+    article_labels = assign_topic_labels(article_content)
+    label_cache.put((article_id, version, settings), article_labels)
+
+    return article_labels
+
+
+def label_settings() -> Tuple:
+    """The current value of each of LABEL_SETTINGS."""
+
+    return tuple(getattr(config, name) for name in LABEL_SETTINGS)
+
+
+def model_version() -> Optional[str]:
+    """Version of the model files to cache labels against, worked out without loading any models.
+
+    Downloaded models are identified by the checksums in their download marker,
+    others by the fingerprint of their files. None if the models aren't there yet.
+    """
+
+    try:
+        return models.version(model_fetcher.recorded_checksums(config.local_model_path))
+    except OSError:
+        return None
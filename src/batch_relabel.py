@@ -0,0 +1,278 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from stat import S_ISREG
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import config
+import model_fetcher
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Offline relabelling of a whole archive of articles, either CPS asset ids
+    (one per line) or a JSONL of article texts ({"id": ..., "text": ...}).
+
+    Input is read a chunk of lines at a time and the chunks are labelled on a
+    pool of worker processes, each of which loads spacy and the models once.
+    Only a bounded number of chunks are in flight at any time and results are
+    written out in input order as soon as they are ready, so memory stays flat
+    however large the input is. After every chunk written, the number of input
+    lines done and the size of the output are saved to a checkpoint file along
+    with the path, size and modification time of the input, and --resume
+    carries on from there after a crash or an interrupt, as long as the input
+    is the same file unchanged. The checkpoint is deleted once a run finishes.
+
+    Each output line is {"line": ..., "id": ..., "labels": [...]}, with "title"
+    for CPS assets, or {"line": ..., "id": ..., "error": "..."} if the article
+    could not be labelled.
+
+    Run with: python src/batch_relabel.py ids.txt labels.jsonl --workers 8
+'''
+
+INPUT_FORMATS = ('ids', 'texts')
+
+# Lines of input labelled as one unit of work by a worker
+DEFAULT_CHUNK_SIZE = 32
+
+# Chunks in flight per worker, enough to keep every worker busy while results are written
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def init_worker(model_path: str):
+    """Load spacy and the models once per worker process."""
+
+    config.local_model_path = model_path
+
+    import topic_labelling
+    topic_labelling.initialise()
+
+
+def label_chunk(input_format: str, lines: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Label a chunk of (line number, line) input in a worker, returning a result for each line."""
+
+    from topic_labelling import assign_topic_labels_batch
+
+    results = read_articles(input_format, lines)
+    articles = [result for result in results if 'error' not in result]
+    if not articles:
+        return results
+
+    try:
+        labels = assign_topic_labels_batch([article['content'] for article in articles])
+    except Exception:
+        # Label the articles one at a time so a bad article only fails its own line
+        logger.exception(f'Error labelling the chunk from line {lines[0][0]}, labelling its articles one by one')
+        labels = []
+        for article in articles:
+            try:
+                labels.extend(assign_topic_labels_batch([article['content']]))
+            except Exception as e:
+                article['error'] = str(e)
+                labels.append(None)
+
+    for article, article_labels in zip(articles, labels):
+        del article['content']
+        if article_labels is not None:
+            article['labels'] = article_labels
+
+    return results
+
+
+def read_articles(input_format: str, lines: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Get the content of the article on each line, or the error if it can't be got."""
+
+    if input_format == 'texts':
+        articles = []
+        for line_number, line in lines:
+            try:
+                article = json.loads(line)
+                articles.append({'line': line_number, 'id': article.get('id', line_number), 'content': article['text']})
+            except (ValueError, KeyError, TypeError, AttributeError):
+                articles.append({'line': line_number, 'id': line_number, 'error': 'Line is not JSON with a text field'})
+
+        return articles
+
+    import cps_client
+
+    article_ids = [line.strip() for _, line in lines]
+    fetched = cps_client.get_client(os.environ['CPS_API_KEY']).get_articles(article_ids, return_exceptions=True)
+
+    articles = []
+    for (line_number, _), article_id, article in zip(lines, article_ids, fetched):
+        if isinstance(article, Exception):
+            articles.append({'line': line_number, 'id': article_id, 'error': str(article)})
+        else:
+            title, content = article
+            articles.append({'line': line_number, 'id': article_id, 'title': title, 'content': content})
+
+    return articles
+
+
+def read_chunks(input_file: TextIO, chunk_size: int, skip_lines: int) -> Iterator[Tuple[int, List[Tuple[int, str]]]]:
+    """Lazily read the input as (lines read so far, chunk of non blank (line number, line)).
+
+    Blank lines are skipped but still counted so line numbers match the input file.
+    """
+
+    chunk = []
+    line_number = 0
+    for line_number, line in enumerate(input_file, start=1):
+        if line_number <= skip_lines or not line.strip():
+            continue
+
+        chunk.append((line_number, line))
+        if len(chunk) == chunk_size:
+            yield line_number, chunk
+            chunk = []
+
+    if chunk:
+        yield line_number, chunk
+
+
+def load_checkpoint(checkpoint_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(checkpoint_path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+
+
+def input_identity(input_file: TextIO) -> Optional[Dict[str, Any]]:
+    """The path, size and modification time of the input, None if it isn't a regular file, e.g. stdin."""
+
+    try:
+        stat = os.fstat(input_file.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+
+    return {'path': os.path.abspath(input_file.name), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]):
+    # Written to a temporary file and renamed so a crash can't leave half a checkpoint
+    temporary_path = f'{checkpoint_path}.tmp'
+    with open(temporary_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def relabel(
+        input_file: TextIO,
+        output_path: str,
+        input_format: str,
+        workers: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checkpoint_path: Optional[str] = None,
+        resume: bool = False) -> int:
+    """Label every article in input_file on a pool of worker processes, writing the results to output_path.
+
+    Args:
+        input_file: Open file of CPS asset ids or JSONL article texts, one per line.
+        output_path: JSONL file the results are written to, in input order.
+        input_format: 'ids' or 'texts'.
+        workers: Number of worker processes.
+        chunk_size: Number of lines each worker labels at a time.
+        checkpoint_path: File recording progress, defaults to output_path + '.checkpoint'.
+        resume: Carry on from the checkpoint rather than starting again, the input must be the same file unchanged.
+
+    Returns:
+        The number of articles labelled in this run.
+    """
+
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f'input_format must be one of {INPUT_FORMATS}, not {input_format}')
+
+    checkpoint_path = checkpoint_path or f'{output_path}.checkpoint'
+    input_checked = input_identity(input_file)
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint is None:
+        checkpoint = {'lines': 0, 'output_bytes': 0, 'input': input_checked}
+    elif input_checked is None or checkpoint.get('input') != input_checked:
+        # Resuming with another input would skip its first lines and append to the other's labels
+        raise ValueError(f"Checkpoint {checkpoint_path} is for the input {checkpoint.get('input')}, not "
+                         f"{input_checked or 'one that can be checked'}, run without resume to start again")
+    else:
+        logger.info(f"Resuming after line {checkpoint['lines']} of the input")
+
+    if config.download_models:
+        import topic_labelling
+
+        model_fetcher.fetch_models(config.local_model_path, required_files=topic_labelling.models.filenames())
+
+    output_mode = 'r+b' if checkpoint['output_bytes'] else 'wb'
+    with open(output_path, output_mode) as output_file, ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(config.local_model_path,)) as pool:
+        # Drop anything written after the last checkpoint, it is labelled again
+        output_file.seek(checkpoint['output_bytes'])
+        output_file.truncate()
+
+        in_flight = deque()
+        labelled = 0
+        start = time.perf_counter()
+
+        def write_oldest():
+            nonlocal labelled
+            lines_read, future = in_flight.popleft()
+            for result in future.result():
+                output_file.write((json.dumps(result) + '\n').encode('utf-8'))
+            output_file.flush()
+            labelled += len(future.result())
+
+            save_checkpoint(
+                checkpoint_path, {'lines': lines_read, 'output_bytes': output_file.tell(), 'input': input_checked}
+                )
+            logger.info(f'Labelled {labelled} articles to line {lines_read}, '
+                        f'{labelled / (time.perf_counter() - start):.1f} articles/sec')
+
+        for lines_read, chunk in read_chunks(input_file, chunk_size, checkpoint['lines']):
+            in_flight.append((lines_read, pool.submit(label_chunk, input_format, chunk)))
+            if len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                write_oldest()
+
+        while in_flight:
+            write_oldest()
+
+    # Finished, so a later run with the same output starts again rather than resuming
+    try:
+        os.remove(checkpoint_path)
+    except FileNotFoundError:
+        pass
+
+    return labelled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Label an archive of articles on a pool of worker processes')
+    parser.add_argument('input', help="File of CPS asset ids or JSONL article texts, one per line, '-' for stdin")
+    parser.add_argument('output', help='JSONL file to write the labels to')
+    parser.add_argument('--format', choices=INPUT_FORMATS, default='ids',
+                        help='Whether each input line is a CPS asset id or JSON with a text field')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of lines each worker labels at a time')
+    parser.add_argument('--checkpoint', help='Checkpoint file, defaults to the output file with .checkpoint added')
+    parser.add_argument('--resume', action='store_true', help='Carry on from the checkpoint of an earlier run')
+    parser.add_argument('--model-path', default=config.local_model_path, help='Directory holding the model files')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(processName)s %(name)s %(message)s')
+    config.local_model_path = arguments.model_path
+
+    if arguments.input == '-':
+        total = relabel(sys.stdin, arguments.output, arguments.format, arguments.workers,
+                        arguments.chunk_size, arguments.checkpoint, arguments.resume)
+    else:
+        with open(arguments.input) as input_file:
+            total = relabel(input_file, arguments.output, arguments.format, arguments.workers,
+                            arguments.chunk_size, arguments.checkpoint, arguments.resume)
+
+    logger.info(f'Labelled {total} articles into {arguments.output}')
@@ -2,15 +2,79 @@ import os
 
 log_level = os.getenv('LOG_LEVEL', 'DEBUG').upper()
 
+# Per stage latency metrics, written to the logs in CloudWatch Embedded Metric Format
+metrics_enabled = os.getenv('METRICS_ENABLED', 'True') == 'True'
+metrics_namespace = os.getenv('METRICS_NAMESPACE', 'TopicModelSlackBot')
+metrics_service = os.getenv('METRICS_SERVICE', 'topic-model-slack-bot')
+
+# Most milliseconds importing the lambda module may take, checked by scripts/check_import_time.py
+import_time_budget_ms = float(os.getenv('IMPORT_TIME_BUDGET_MS', '150'))
+
+# number of threads the lambda handler uses for work that runs alongside
+# the main thread, e.g. loading models and posting to slack
+handler_threads = int(os.getenv('HANDLER_THREADS', '4'))
+
+# Labelling server, see label_server.py
+server_host = os.getenv('SERVER_HOST', '127.0.0.1')
+server_port = int(os.getenv('SERVER_PORT', '8080'))
+# number of requests handled at once
+server_workers = int(os.getenv('SERVER_WORKERS', '4'))
+server_max_body_bytes = int(os.getenv('SERVER_MAX_BODY_BYTES', str(10 * 1024 * 1024)))
+
+# seconds to wait for slack to respond to a post
+slack_timeout = float(os.getenv('SLACK_TIMEOUT', '5'))
+# slack web API the client posts to, can be pointed at a local stand in, e.g. scripts/fake_services.py
+slack_api_url = os.getenv('SLACK_API_URL', 'https://www.slack.com/api/')
+
+# CPS content API
+cps_api_url = os.getenv('CPS_API_URL', 'http://content-api-a127.api.bbci.co.uk/cms/cps/asset')
+cps_connect_timeout = float(os.getenv('CPS_CONNECT_TIMEOUT', '3.05'))
+cps_read_timeout = float(os.getenv('CPS_READ_TIMEOUT', '10'))
+cps_retries = int(os.getenv('CPS_RETRIES', '3'))
+cps_backoff_factor = float(os.getenv('CPS_BACKOFF_FACTOR', '0.3'))
+# connections kept open to the API, also the number of concurrent bulk requests
+cps_pool_size = int(os.getenv('CPS_POOL_SIZE', '10'))
+
+# Article and label caches
+cache_max_entries = int(os.getenv('CACHE_MAX_ENTRIES', '256'))
+# seconds before a cached article or labels are refetched, so edits to articles are picked up
+cache_ttl_seconds = float(os.getenv('CACHE_TTL_SECONDS', '900'))
+# set to an empty string to only cache in memory
+cache_dir = os.getenv('CACHE_DIR', '/tmp/cache')
+
 # Models
 download_models = os.getenv('DOWNLOAD_MODELS', 'True') == 'True'
 model_bucket = os.getenv('MODEL_BUCKET', 'topic-model-slack-bot-lambda-code-bucket')
+# model archive, a .zip, .tar or .tar.gz of the files in models/
 model_zip_s3_key = os.getenv('MODEL_ZIP_S3_KEY', 'models.zip')
+# if set, the model files are downloaded in parallel from separate objects under this prefix instead
+model_s3_prefix = os.getenv('MODEL_S3_PREFIX', '')
+model_download_threads = int(os.getenv('MODEL_DOWNLOAD_THREADS', '8'))
+# S3 endpoint the models are downloaded from, empty for AWS. Set for an S3 compatible
+# store, e.g. scripts/fake_services.py, which is then addressed path style
+s3_endpoint_url = os.getenv('S3_ENDPOINT_URL', '')
 local_model_path = os.getenv('LOCAL_MODEL_PAT', '/tmp/models')
-local_model_zip_path = os.path.join(local_model_path, 'models.zip')
 
 # Topic labelling config
 
+# 'rule' keeps the spacy tagger so lemmas are unchanged, 'lookup' drops it
+# and uses lookup table lemmas only, which is faster but can change lemmas
+spacy_lemmatizer_mode = os.getenv('SPACY_LEMMATIZER_MODE', 'rule')
+
+# number of documents spacy processes at a time when labelling in batch
+spacy_batch_size = int(os.getenv('SPACY_BATCH_SIZE', '64'))
+
+# articles longer than this many characters are preprocessed in chunks of about
+# stream_chunk_chars, so memory doesn't grow with the article and spacy's
+# max_length doesn't apply. Shorter articles are processed whole
+stream_document_chars = int(os.getenv('STREAM_DOCUMENT_CHARS', '100000'))
+stream_chunk_chars = int(os.getenv('STREAM_CHUNK_CHARS', '10000'))
+
+# precision of the topic-word matrix used for inference, 'float64' as gensim, or 'float16' or 'int8'
+# to load the smaller quantized matrix built by scripts/build_inference_artifact.py --precision,
+# check the effect on labels with scripts/quantization_report.py
+lda_topic_word_precision = os.getenv('LDA_TOPIC_WORD_PRECISION', 'float64')
+
 # topics below this score aren't added as tags
 topic_score_threshold_low = 0.18 
 
@@ -0,0 +1,147 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from html_text import extract_text
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Client for getting article content from the CPS content API
+'''
+
+CPS_HEADERS = {
+    "X-Candy-Platform": "desktop",
+    "x-candy-audience": "domestic",
+    "Accept": "application/json"
+}
+
+# Server errors worth retrying, anything else is returned straight away
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class ArticleNotFoundError(Exception):
+    """The content API has no asset with the id asked for."""
+
+
+class CPSClient:
+    """Fetches CPS assets over a pooled session so connections are kept alive between requests.
+
+    Settings not given are read from config when the client is created, so
+    overriding config after import takes effect.
+
+    Args:
+        api_key: Key for the CPS content API.
+        base_url: URL assets are requested from, the asset id is appended to it.
+        connect_timeout: Seconds to wait to connect to the API.
+        read_timeout: Seconds to wait for the API to respond.
+        retries: Number of times to retry a request on a connection error or 5xx response.
+        backoff_factor: Retries wait backoff_factor * 2 ** (retry number - 1) seconds.
+        pool_size: Maximum number of connections kept open, and requests made at once by get_articles.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            base_url: Optional[str] = None,
+            connect_timeout: Optional[float] = None,
+            read_timeout: Optional[float] = None,
+            retries: Optional[int] = None,
+            backoff_factor: Optional[float] = None,
+            pool_size: Optional[int] = None):
+        retries = config.cps_retries if retries is None else retries
+        backoff_factor = config.cps_backoff_factor if backoff_factor is None else backoff_factor
+
+        self.api_key = api_key
+        self.base_url = (base_url or config.cps_api_url).rstrip('/')
+        self.timeout = (
+            config.cps_connect_timeout if connect_timeout is None else connect_timeout,
+            config.cps_read_timeout if read_timeout is None else read_timeout,
+            )
+        self.pool_size = pool_size or config.cps_pool_size
+
+        # raise_on_status=False returns the last response once retries run out
+        # so it is handled like any other non 200 response
+        retry = Retry(
+            total=retries, backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES, raise_on_status=False
+            )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(CPS_HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_article(self, article_id: str) -> Tuple[str, str]:
+        """Get the title and text content (title, summary and body with no HTML) of an article."""
+
+        response = self.session.get(
+            f"{self.base_url}/{article_id}", params={'api_key': self.api_key}, timeout=self.timeout
+            )
+
+        if response.status_code == 404:
+            raise ArticleNotFoundError("Invalid id given, article could not be found")
+        if response.status_code != 200:
+            raise Exception("Invalid id given, article could not be found")
+
+        return parse_article(response.json())
+
+    def get_articles(
+            self,
+            article_ids: Iterable[str],
+            return_exceptions: bool = False) -> List[Union[Tuple[str, str], Exception]]:
+        """Get many articles at once, making up to pool_size requests concurrently.
+
+        Args:
+            article_ids: Ids of the articles to get.
+            return_exceptions: If True, the exception for an article that could not be fetched is
+                returned in its place rather than raised.
+
+        Returns:
+            (title, content) for each article, in the same order as article_ids.
+        """
+
+        def get_article(article_id):
+            try:
+                return self.get_article(article_id)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                logger.warning(f"Could not get article {article_id}: {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as pool:
+            return list(pool.map(get_article, article_ids))
+
+
+def parse_article(response_json) -> Tuple[str, str]:
+    """Get the title and text content from a CPS asset response."""
+
+    title = response_json["results"][0]["title"]
+    summary = response_json["results"][0]["summary"]
+    body_with_html = response_json["results"][0]["body"]
+
+    # Prose only, with entities decoded and captions, scripts etc. left out
+    body_text = extract_text(body_with_html)
+
+    return title, f"{title} {summary} {body_text}"
+
+
+_client: Optional[CPSClient] = None
+
+
+def get_client(api_key: str) -> CPSClient:
+    """Return the module level client, so connections are reused on warm invocations."""
+
+    global _client
+    if _client is None or _client.api_key != api_key:
+        _client = CPSClient(api_key)
+
+    return _client
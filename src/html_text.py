@@ -0,0 +1,101 @@
+from html.parser import HTMLParser
+from typing import Iterator, List
+
+'''
+    Streaming extraction of the prose in an HTML or CPS XML article body.
+
+    The body is fed to the parser a chunk at a time and each block of text
+    (paragraph, heading, list item...) is yielded as soon as it is closed, with
+    entities decoded and the text of non-prose elements (scripts, styles,
+    images and their captions, video and audio) left out.
+'''
+
+# Elements whose text isn't part of the article, e.g. image captions and alt text.
+# CPS XML tags (image, video, alttext) are included as well as HTML ones, all lower
+# case as the parser lower cases tag names
+SKIPPED_TAGS = frozenset([
+    'script', 'style', 'noscript', 'template', 'head', 'svg', 'math', 'iframe', 'object',
+    'figure', 'figcaption', 'image', 'video', 'audio', 'alttext',
+])
+
+# Elements that start or end a block of text, so text either side isn't run together
+BLOCK_TAGS = frozenset([
+    'p', 'paragraph', 'div', 'section', 'article', 'header', 'footer', 'br', 'hr',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'heading', 'crosshead', 'subheadline',
+    'ul', 'ol', 'li', 'list', 'listitem', 'dl', 'dt', 'dd', 'blockquote', 'pre',
+    'table', 'tr', 'td', 'th',
+])
+
+# Characters of the body fed to the parser at a time
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+class TextBlockParser(HTMLParser):
+    """HTML parser that collects the text blocks of the markup fed to it, see extract_text_blocks."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[str] = []
+        self._block_text: List[str] = []
+        self._skipped_tags: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skipped_tags.append(tag)
+        elif tag in BLOCK_TAGS:
+            self.end_block()
+
+    def handle_startendtag(self, tag, attrs):
+        # Self closing, e.g. <br/> or <image .../>, has no text to skip
+        if tag in BLOCK_TAGS:
+            self.end_block()
+
+    def handle_endtag(self, tag):
+        if self._skipped_tags:
+            # Text is skipped until the outermost skipped element closes. Closing an element also closes
+            # those left open inside it, e.g. an HTML <image>, which is void like <img>, inside a <figure>
+            if tag in self._skipped_tags:
+                del self._skipped_tags[len(self._skipped_tags) - 1 - self._skipped_tags[::-1].index(tag):]
+        elif tag in BLOCK_TAGS:
+            self.end_block()
+
+    def handle_data(self, data):
+        if not self._skipped_tags:
+            self._block_text.append(data)
+
+    def end_block(self):
+        block = ''.join(self._block_text).strip()
+        self._block_text = []
+        if block:
+            self.blocks.append(block)
+
+    def close(self):
+        super().close()
+        self.end_block()
+
+
+def extract_text_blocks(markup: str, chunk_size: int = FEED_CHUNK_SIZE) -> Iterator[str]:
+    """Yield the blocks of prose in an HTML or CPS XML body as they are parsed.
+
+    Args:
+        markup: The article body.
+        chunk_size: Characters fed to the parser at a time, so it doesn't hold a copy of the whole body.
+
+    Yields:
+        Each paragraph, heading, list item etc. as plain text with entities decoded.
+    """
+
+    parser = TextBlockParser()
+    for start in range(0, len(markup), chunk_size):
+        parser.feed(markup[start:start + chunk_size])
+        yield from parser.blocks
+        parser.blocks.clear()
+
+    parser.close()
+    yield from parser.blocks
+
+
+def extract_text(markup: str) -> str:
+    """The prose of an HTML or CPS XML body as plain text, one block per line."""
+
+    return '\n'.join(extract_text_blocks(markup))
@@ -0,0 +1,115 @@
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+'''
+    Topic to label group mapping from topic_labels.json, compiled into arrays
+    so topic distributions are grouped and thresholded for a whole batch of
+    documents with a few numpy operations instead of per document dicts.
+'''
+
+# Label of topics left out of every label group
+REMOVE_LABEL = 'REMOVE'
+
+
+class LabelGroups:
+    """Groups topic probabilities by their text label and picks the labels to assign.
+
+    Args:
+        topic_labels: Mapping of topic number (as a string) to text label, as in topic_labels.json.
+            Topics labelled REMOVE are left out.
+        num_topics: Number of topics in the model, every topic must have a label.
+    """
+
+    def __init__(self, topic_labels: Dict[str, str], num_topics: int):
+        missing_topics = [topic_num for topic_num in range(num_topics) if str(topic_num) not in topic_labels]
+        if missing_topics:
+            raise ValueError(f'Topic label does not exist for topics {missing_topics}, check topic_labels.json is correct!')
+
+        # Groups are numbered in order of their first topic
+        self.labels: List[str] = []
+        group_nums: Dict[str, int] = {}
+        self.topic_groups = np.full(num_topics, -1, dtype=np.int64)
+        for topic_num in range(num_topics):
+            label = topic_labels[str(topic_num)]
+            if label == REMOVE_LABEL:
+                continue
+            if label not in group_nums:
+                group_nums[label] = len(self.labels)
+                self.labels.append(label)
+            self.topic_groups[topic_num] = group_nums[label]
+
+        # num_topics x num_groups, 1 where a topic is in a group, all 0 for REMOVE topics
+        self.group_matrix = np.zeros((num_topics, len(self.labels)))
+        kept_topics = np.flatnonzero(self.topic_groups >= 0)
+        self.group_matrix[kept_topics, self.topic_groups[kept_topics]] = 1
+
+        # The kept topics ordered by group, and where each group starts in that order
+        self._topics_by_group = kept_topics[np.argsort(self.topic_groups[kept_topics], kind='stable')]
+        self._group_starts = np.searchsorted(self.topic_groups[self._topics_by_group], np.arange(len(self.labels)))
+
+    @classmethod
+    def load(cls, path: str, num_topics: int) -> 'LabelGroups':
+        with open(path) as labels_file:
+            return cls(json.load(labels_file), num_topics)
+
+    @property
+    def num_topics(self) -> int:
+        return len(self.topic_groups)
+
+    def group(self, topic_distributions: np.ndarray, minimum_probability: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum the probabilities of the topics in each group, leaving out topics below minimum_probability.
+
+        Args:
+            topic_distributions: num_docs x num_topics topic probabilities.
+            minimum_probability: Topics below this are left out, as they are from topic vectors.
+
+        Returns:
+            num_docs x num_groups group scores, and the first topic of each group in each
+            document's topic vector, num_topics for groups with no topics in it.
+        """
+
+        in_vector = topic_distributions >= minimum_probability
+        scores = np.where(in_vector, topic_distributions, 0).astype(np.float64) @ self.group_matrix
+
+        topic_nums = np.where(in_vector, np.arange(self.num_topics), self.num_topics)
+        first_topics = np.minimum.reduceat(topic_nums[:, self._topics_by_group], self._group_starts, axis=1)
+
+        return scores, first_topics
+
+    def assign(
+            self,
+            scores: np.ndarray,
+            first_topics: np.ndarray,
+            low_threshold: float,
+            high_threshold: float,
+            max_labels: int = 3) -> List[List[Tuple[str, float]]]:
+        """Pick the labels for each document from its group scores.
+
+        As many of the top max_labels groups as it takes for their scores to pass
+        high_threshold, leaving out any below low_threshold.
+
+        Returns:
+            (label, score) for each document's assigned labels, highest score first,
+            an empty list for documents with no groups above low_threshold.
+        """
+
+        max_labels = min(max_labels, scores.shape[1])
+
+        # Highest scores first, ties in the order the groups appear in the document's topic vector
+        order = np.lexsort((first_topics, -scores), axis=-1)[:, :max_labels]
+        top_scores = np.take_along_axis(scores, order, axis=1)
+
+        # Being in descending order, the scores above low_threshold come first, and
+        # each is assigned if those before it haven't yet passed high_threshold
+        above_threshold = top_scores >= low_threshold
+        cumulative_scores = np.cumsum(np.where(above_threshold, top_scores, 0), axis=1)
+        scores_before = np.hstack([np.zeros((len(scores), 1)), cumulative_scores[:, :-1]])
+        assigned = above_threshold & (scores_before <= high_threshold)
+
+        return [
+            [(self.labels[group_num], score) for group_num, score, is_assigned in zip(doc_order, doc_scores, doc_assigned)
+             if is_assigned]
+            for doc_order, doc_scores, doc_assigned in zip(order, top_scores, assigned)
+        ]
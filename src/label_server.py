@@ -0,0 +1,201 @@
+import argparse
+import json
+import logging
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Tuple
+
+import config
+import metrics
+import model_fetcher
+from article_labels import get_article_content, get_article_labels
+from cps_client import ArticleNotFoundError
+from single_flight import SingleFlight
+import topic_labelling
+from topic_labelling import assign_topic_labels
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Long running labelling service, an alternative entry point to the lambda
+    that keeps spacy and the topic model loaded between requests.
+
+    POST /label             Labels the raw article text in the request body,
+                            either plain text or JSON of the form {"text": "..."}
+    GET  /label/<asset_id>  Labels a CPS asset, through the article and label caches.
+                            Concurrent requests for the same asset share one
+                            fetch and labelling
+    GET  /health            Returns 200 once the models are loaded
+    GET  /stats             Counts of assets labelled and requests coalesced
+
+    Run with: python src/label_server.py --port 8080 --workers 4
+'''
+
+ASSET_PATH_PATTERN = re.compile(r'^/label/([^/]+)$')
+
+# Requests for an asset that's already being labelled wait for it rather than labelling it again
+asset_flights = SingleFlight('label_asset')
+
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        # Routed on the path alone, ignoring any query string
+        path = urllib.parse.urlsplit(self.path).path
+
+        if path == '/health':
+            self.send_json(200, {'status': 'ok'})
+            return
+
+        if path == '/stats':
+            self.send_json(200, {'label_asset': asset_flights.stats()})
+            return
+
+        asset_match = ASSET_PATH_PATTERN.match(path)
+        if asset_match is None:
+            self.send_json(404, {'error': f'No endpoint at {path}'})
+            return
+
+        self.respond(label_asset, urllib.parse.unquote(asset_match.group(1)))
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path != '/label':
+            self.send_json(404, {'error': f'No endpoint at {path}'})
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = -1
+
+        # A negative length would read until the client closes the connection
+        if content_length < 0:
+            self.send_json(400, {'error': 'Content-Length must be a whole number of bytes'})
+            return
+        if content_length > config.server_max_body_bytes:
+            self.send_json(413, {'error': f'Body larger than {config.server_max_body_bytes} bytes'})
+            return
+
+        body = self.rfile.read(content_length)
+        try:
+            body = body.decode('utf-8')
+        except UnicodeDecodeError:
+            self.send_json(400, {'error': 'Body must be UTF-8 encoded'})
+            return
+
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                text = json.loads(body)['text']
+            except (ValueError, KeyError, TypeError):
+                text = None
+
+            if not isinstance(text, str):
+                self.send_json(400, {'error': 'JSON body must be of the form {"text": "..."}'})
+                return
+        else:
+            text = body
+
+        if not text.strip():
+            self.send_json(400, {'error': 'No article text given'})
+            return
+
+        self.respond(label_text, text)
+
+    def respond(self, label_function, *args):
+        try:
+            status, response = label_function(*args)
+        except ArticleNotFoundError as e:
+            status, response = 404, {'error': str(e)}
+        except Exception as e:
+            logger.exception(f'Error handling {self.command} {self.path}')
+            status, response = 500, {'error': str(e)}
+
+        self.send_json(status, response)
+
+    def send_json(self, status: int, response: Dict[str, Any]):
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info(f'{self.address_string()} {format % args}')
+
+
+@metrics.invocation('label_text')
+def label_text(text: str) -> Tuple[int, Dict[str, Any]]:
+    return 200, {'labels': assign_topic_labels(text)}
+
+
+@metrics.invocation('label_asset')
+def label_asset(asset_id: str) -> Tuple[int, Dict[str, Any]]:
+    title, article_labels = asset_flights.do(asset_id, get_asset_labels, asset_id)
+
+    return 200, {'asset_id': asset_id, 'title': title, 'labels': article_labels}
+
+
+def get_asset_labels(asset_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+    title, article_content = get_article_content(asset_id)
+    article_labels = get_article_labels(asset_id, article_content)
+
+    return title, article_labels
+
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """HTTP server that handles requests on a fixed size pool of worker threads."""
+
+    def __init__(self, server_address, request_handler_class, workers: int):
+        super().__init__(server_address, request_handler_class)
+        self.workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='label-worker')
+
+    def process_request(self, request, client_address):
+        self.workers.submit(self.process_request_in_worker, request, client_address)
+
+    def process_request_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.workers.shutdown(wait=True)
+
+
+def serve(host: str, port: int, workers: int):
+    if config.download_models:
+        model_fetcher.fetch_models(config.local_model_path, required_files=topic_labelling.models.filenames())
+
+    logger.info(f'Loading models from {config.local_model_path}')
+    topic_labelling.initialise()
+
+    server = WorkerPoolHTTPServer((host, port), LabelRequestHandler, workers)
+    logger.info(f'Serving topic labels on http://{host}:{port} with {workers} workers')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve topic labels over HTTP')
+    parser.add_argument('--host', default=config.server_host)
+    parser.add_argument('--port', type=int, default=config.server_port)
+    parser.add_argument('--workers', type=int, default=config.server_workers,
+                        help='Number of requests handled at once')
+    parser.add_argument('--model-path', default=config.local_model_path, help='Directory holding the model files')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    config.local_model_path = arguments.model_path
+    serve(arguments.host, arguments.port, arguments.workers)
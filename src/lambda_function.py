@@ -1,58 +1,71 @@
-import re
-import unicodedata
-import emoji
-import json
-import datetime as dt
 import os
 import traceback
-import boto3
-import requests
-import zipfile
-import time
+import urllib.parse
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 
 
 import config
+import metrics
+import model_fetcher
 from post_to_slack import *
-from topic_labelling import assign_topic_labels
+from slack_responder import SlackResponder
 
 logger = logging.getLogger(__name__)
 logger.setLevel(config.log_level)
 
 ### CREDENTIALS FOR SLACK AND DROPBOX ######
-SLACK_AUTH_TOKEN = os.environ['TOPIC_MODEL_SLACK_AUTH_TOKEN']
-CPS_API_KEY = os.environ['CPS_API_KEY']
+# Read when a slack command is handled rather than on import, so the module
+# can be imported, and scheduled events handled, without it
+SLACK_AUTH_TOKEN_VARIABLE = 'TOPIC_MODEL_SLACK_AUTH_TOKEN'
 
 DEFAULT_SLACK_CHANNEL = "#topic-model"
 
+# Runs work that can overlap with the main thread, i.e. model downloading and
+# loading and posting to slack. Kept at module level so the threads are reused
+# on warm invocations
+executor = ThreadPoolExecutor(max_workers=config.handler_threads)
+
 # This is the entry point of the lambda 
+@metrics.invocation('lambda_handler')
 def lambda_handler(event, context):
-    download_models()
+    # Check the event before loading anything heavy, e.g. the slack client, spacy and the models
+    trigger = get_event_source(event)
+    metrics.set_property('trigger', trigger)
 
-    slack = initialise_slack_client(SLACK_AUTH_TOKEN)
+    # Scheduled events only keep the container warm, nothing is posted to slack
+    if trigger == "aws-trigger":
+        return warm_up()
 
-    trigger = get_event_source(event)
+    slack = initialise_slack_client(os.environ[SLACK_AUTH_TOKEN_VARIABLE])
 
     # Set the channel to post output to
     slack_channel = get_slack_channel_name(event, trigger)
+
+    # The reply to the command, title and labels are posted together as one message
+    responder = SlackResponder(slack, slack_channel, executor, get_slack_response_url(event, trigger))
+
+    # Get the models ready while the article is fetched
+    models_ready = executor.submit(contextvars.copy_context().run, prepare_models)
     try:
+        # Imported here rather than with the module as they bring in spacy, numpy and requests
+        from article_labels import get_article_content, get_article_labels
+
         event_body=parse_slack_event_body(event)
         
         article_id = event_body['text']
         title, article_content = get_article_content(article_id)
+        responder.add(f"Labels for article:\n*{title}*", emoji=':bbcnews:')
 
-        # Post title 
-        logger.debug(f"Writing to slack channel {slack_channel}")
-        post_message_to_slack(slack, slack_channel, f"Getting labels for article:\n*{title}*", emoji=':bbcnews:')
-
-        # apply model
-        article_labels = assign_topic_labels(article_content)
+        # apply model, only waiting for the models if the labels aren't cached
+        article_labels = get_article_labels(article_id, article_content, models_ready)
         print(article_labels)
 
         # Prepare lables for posting to slack 
         labels_string = ', '.join([f"{topic['name']} ({round(topic['score'],2)})" for topic in article_labels])
-        topics_message = f"Labels: *{labels_string}*"
-        post_message_to_slack(slack, slack_channel, topics_message, emoji=emoji.emojize(':tick:'))
+        responder.add(f"Labels: *{labels_string}*", emoji=emojize(':tick:'))
+        responder.send()
 
         return { "statusCode": 200, "body": "Lambda completed sucessfully" }
     except Exception as e:
@@ -60,67 +73,55 @@ def lambda_handler(event, context):
         # If the lmabda raises an exception it will retry with the same event 3 times, we 
         # don't want this so just print the stack trace to see in logs and on slack
         traceback.print_exc()
-        post_error_to_slack(slack, slack_channel, e)
+        metrics.put_metric('error', 1, 'Count')
+        responder.add(f"ERROR: {e}", emoji=emojize(':bangbang:'))
+        responder.send()
         print("ERROR CAUGHT: ", e)
+    finally:
+        # The container is frozen once the handler returns so don't leave
+        # anything running in the background
+        wait([models_ready])
+        responder.wait()
+
 
+def prepare_models():
+    """Download the models if needed and load spacy and the models."""
 
+    import topic_labelling
 
-def get_article_content(article_id):
+    download_models()
+    topic_labelling.initialise()
 
-    query_string = f"http://content-api-a127.api.bbci.co.uk/cms/cps/asset/{article_id}?api_key={CPS_API_KEY}"
 
-    headers = {
-        "X-Candy-Platform": "desktop",
-        "x-candy-audience": "domestic",
-        "Accept": "application/json"
-    }
-    response = requests.get(query_string, headers=headers)
+@metrics.timed('warm_up')
+def warm_up():
+    """Get the models ready and label a canned document, so the next slack command is handled warm.
 
-    if response.status_code != 200:
-        raise Exception("Invalid id given, article could not be found")
-    
-    response_json = response.json()
-    
-    title = response_json["results"][0]["title"]
-    summary = response_json["results"][0]["summary"]
-    body_with_html = response_json["results"][0]["body"]
+    Errors are logged rather than raised, as lambda retries a failed scheduled
+    invocation twice and the next scheduled event tries again anyway.
+    """
 
-    body_cleaned = re.sub('<[^<]+?>', '', body_with_html)
+    try:
+        import topic_labelling
+
+        download_models()
+        topic_labelling.warm_up()
+    except Exception:
+        logger.exception('Warm up failed')
+        metrics.put_metric('warm_up_error', 1, 'Count')
+        return { "statusCode": 500, "body": "Lambda warm up failed" }
 
-    return title, f"{title} {summary} {body_cleaned}"
+    return { "statusCode": 200, "body": "Lambda warmed up" }
 
 
+@metrics.timed('download_models')
 def download_models():
     """Download models to local cache from S3 if they're not already there."""
-    
-    print("pre download")
-    for item in os.walk('/tmp'):
-        print(item)
-
-    print("Download models" , config.download_models)
-    print("Download models" , os.path.exists(config.local_model_path), config.local_model_path)
-
-    if config.download_models and not os.path.exists(config.local_model_path):
-        logger.debug(
-            f'Fetching models from bucket: {config.model_bucket} '
-            f'and key: {config.model_zip_s3_key} '
-            f'to local path: {config.local_model_zip_path}'
-            )
-        os.mkdir(config.local_model_path)
-        s3_client = boto3.client('s3')
-        s3_client.download_file(
-            config.model_bucket, config.model_zip_s3_key,
-            config.local_model_zip_path
-            )
-        logger.debug(
-            f'Downloaded models to {config.local_model_zip_path}. Unzipping...'
-            )
-        with zipfile.ZipFile(config.local_model_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(config.local_model_path)
-
-    print("after download")
-    for item in os.walk('/tmp'):
-        print(item)
+
+    if config.download_models:
+        import topic_labelling
+
+        model_fetcher.fetch_models(config.local_model_path, required_files=topic_labelling.models.filenames())
 
 
 def get_event_source(event):
@@ -157,6 +158,21 @@ def get_slack_channel_name(event, trigger):
         return DEFAULT_SLACK_CHANNEL
 
 
+def get_slack_response_url(event, trigger):
+    '''
+        Get the response_url of a slack slash command, replies posted to it appear
+        in the channel the command was used in
+
+        Returns: the url, or None if the event isn't a slash command
+    '''
+
+    if trigger != "slack-trigger":
+        return None
+
+    response_url = parse_slack_event_body(event).get('response_url')
+    return urllib.parse.unquote(response_url) if response_url else None
+
+
 def validate_event_and_post_trigger_to_slack(event, slack_client, slack_channel, trigger):
     '''
         Posts a triggered message to #stats-releases to say either:
@@ -176,10 +192,10 @@ def validate_event_and_post_trigger_to_slack(event, slack_client, slack_channel,
             trigger_message = f"{event_params['user_name']} triggered lambda from slack command" + \
                               f" in channel {slack_channel if '#' in slack_channel else '#directmessage'}"
         
-        emoji_ = emoji.emojize(':raising_hand:')
+        emoji_ = emojize(':raising_hand:')
     elif trigger == "aws-trigger":
         trigger_message = f"Lambda triggered on schedule"
-        emoji_ = emoji.emojize(':calendar:')
+        emoji_ = emojize(':calendar:')
 
     post_message_to_slack(slack_client, DEFAULT_SLACK_CHANNEL, trigger_message, emoji_)
 
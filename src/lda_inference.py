@@ -0,0 +1,272 @@
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.special import psi
+
+import config
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    LDA topic inference over the topic-word matrix and alpha, without gensim.
+
+    This is the variational E-step of gensim's LdaModel.inference, run for a
+    whole sparse doc-term matrix at once rather than a document at a time.
+    Documents stop updating as soon as they converge, as in gensim, and the
+    iterations continue for the documents that haven't.
+
+    gensim starts every call from numpy's global random state, which we seeded
+    with np.random.seed(100) before each document. Here the starting point is
+    drawn once from a local RandomState(100), which gives every document the
+    same starting point gensim gave it when labelled on its own, whatever else
+    is in the batch, and leaves the global random state alone.
+
+    The topic-word matrix can be quantized to float16 or int8 to shrink it,
+    see quantize_topic_word. Only the columns of the terms in the documents
+    are dequantized, to float32, for each call.
+'''
+
+# Precisions the topic-word matrix can be stored at
+TOPIC_WORD_PRECISIONS = ('float64', 'float16', 'int8')
+
+# int8 code of a zero weight, i.e. a word never seen in the topic
+INT8_ZERO_CODE = -128
+
+
+def dirichlet_expectation(alpha: np.ndarray) -> np.ndarray:
+    """Expected value of log(theta) for theta drawn from a Dirichlet, one row per parameter vector."""
+
+    result = psi(alpha) - psi(np.sum(alpha, axis=1))[:, np.newaxis]
+    return result.astype(alpha.dtype, copy=False)
+
+
+def bow_matrix(bows: Sequence[Tuple[np.ndarray, np.ndarray]], num_terms: int, dtype=np.float32) -> sparse.csr_matrix:
+    """Convert bag of words documents, (token_ids, counts) arrays from Vocabulary.doc2bow, into a sparse doc-term matrix."""
+
+    indptr = np.zeros(len(bows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(token_ids) for token_ids, _ in bows])
+
+    if bows:
+        indices = np.concatenate([token_ids for token_ids, _ in bows]).astype(np.int32, copy=False)
+        counts = np.concatenate([counts for _, counts in bows]).astype(dtype, copy=False)
+    else:
+        indices, counts = np.empty(0, dtype=np.int32), np.empty(0, dtype=dtype)
+
+    return sparse.csr_matrix((counts, indices, indptr), shape=(len(bows), num_terms))
+
+
+def quantize_topic_word(topic_word: np.ndarray, precision: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize the topic-word weights to float16 or int8, with a scale per topic.
+
+    float16: each topic's weights are scaled so its largest is 2 ** 15, which
+    keeps its smallest nonzero weights well within float16's normal range.
+
+    int8: the nonzero weights of a topic span a few orders of magnitude, so a
+    linear int8 scale would round most of them to zero. Instead the log of
+    each nonzero weight is quantized to one of 255 levels between the topic's
+    smallest and largest, and zero weights get INT8_ZERO_CODE.
+
+    Args:
+        topic_word: num_topics x num_terms topic-word weights.
+        precision: 'float16' or 'int8'.
+
+    Returns:
+        The quantized weights and a num_topics x 2 float32 array of (offset, step) per topic,
+        see dequantize_topic_word.
+    """
+
+    topic_word = np.asarray(topic_word, dtype=np.float64)
+    scale = np.zeros((topic_word.shape[0], 2), dtype=np.float64)
+
+    if precision == 'float16':
+        scale[:, 1] = topic_word.max(axis=1) / 2 ** 15
+        scale[scale[:, 1] == 0, 1] = 1
+        codes = (topic_word / scale[:, 1:]).astype(np.float16)
+    elif precision == 'int8':
+        nonzero = topic_word > 0
+        with np.errstate(divide='ignore'):
+            log_weights = np.log(topic_word)
+
+        highest = np.where(nonzero, log_weights, -np.inf).max(axis=1)
+        lowest = np.where(nonzero, log_weights, np.inf).min(axis=1)
+        highest[~nonzero.any(axis=1)] = lowest[~nonzero.any(axis=1)] = 0
+
+        # Codes INT8_ZERO_CODE + 1 to 127 cover lowest to highest
+        scale[:, 1] = np.maximum(highest - lowest, np.finfo(np.float32).eps) / 254
+        scale[:, 0] = lowest - (INT8_ZERO_CODE + 1) * scale[:, 1]
+        codes = np.round((np.where(nonzero, log_weights, highest[:, None]) - scale[:, :1]) / scale[:, 1:])
+        codes = np.where(nonzero, np.clip(codes, INT8_ZERO_CODE + 1, 127), INT8_ZERO_CODE).astype(np.int8)
+    else:
+        raise ValueError(f'Unknown quantized precision {precision}, expected float16 or int8')
+
+    return codes, scale.astype(np.float32)
+
+
+def dequantize_topic_word(codes: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """float32 weights from quantize_topic_word's codes, either the whole matrix or some of its columns.
+
+    A float16 weight is offset + step * code and an int8 weight exp(offset + step * code), or 0 for INT8_ZERO_CODE.
+    """
+
+    offset, step = scale[:, :1], scale[:, 1:]
+    weights = offset + step * codes.astype(np.float32)
+
+    if codes.dtype == np.int8:
+        np.exp(weights, out=weights)
+        weights[codes == INT8_ZERO_CODE] = 0
+
+    return weights
+
+
+class LdaInference:
+    """Topic inference for documents given the topic-word weights and alpha of a trained LDA model.
+
+    Args:
+        topic_word: exp(E[log beta]), the num_topics x num_terms topic-word weights.
+        alpha: Dirichlet prior on the document topic distributions, one value per topic.
+        iterations: Maximum number of E-step iterations per document.
+        gamma_threshold: A document has converged once the mean change in its gamma is below this.
+        minimum_probability: Topics below this probability are left out of topic vectors.
+        random_seed: Seed for the starting value of gamma.
+        topic_scale: If topic_word has been quantized by quantize_topic_word, its per topic scale.
+    """
+
+    def __init__(
+            self,
+            topic_word: np.ndarray,
+            alpha: np.ndarray,
+            iterations: int = 50,
+            gamma_threshold: float = 0.001,
+            minimum_probability: float = 0.01,
+            random_seed: int = 100,
+            topic_scale: Optional[np.ndarray] = None):
+        self.topic_word = topic_word
+        self.topic_scale = topic_scale
+        # Quantized weights are dequantized to float32 to compute with
+        self.dtype = topic_word.dtype if topic_scale is None else np.dtype(np.float32)
+        self.alpha = np.asarray(alpha, dtype=self.dtype)
+        self.num_topics, self.num_terms = topic_word.shape
+        self.iterations = iterations
+        self.gamma_threshold = gamma_threshold
+        # As gensim, never allow zero values in topic vectors
+        self.minimum_probability = max(minimum_probability, 1e-8)
+
+        self.initial_gamma = np.random.RandomState(random_seed).gamma(
+            100., 1. / 100., (1, self.num_topics)
+            ).astype(self.dtype, copy=False)
+
+    def inference(self, doc_term: sparse.csr_matrix) -> np.ndarray:
+        """Estimate gamma, the variational parameters of each document's topic distribution.
+
+        Args:
+            doc_term: Sparse num_docs x num_terms matrix of token counts.
+
+        Returns:
+            num_docs x num_topics array of gamma, in the same dtype as the topic-word weights.
+        """
+
+        num_docs = doc_term.shape[0]
+        epsilon = np.finfo(self.dtype).eps
+        gamma = np.repeat(self.initial_gamma, num_docs, axis=0)
+
+        # Only the columns of the terms in these documents are needed
+        term_ids, doc_term_columns = np.unique(doc_term.indices, return_inverse=True)
+        term_topic = self.term_topic(term_ids)
+
+        # Work on the documents still iterating: their row in gamma, counts and term columns
+        active = np.arange(num_docs)
+        active_counts = sparse.csr_matrix(
+            (doc_term.data.astype(self.dtype, copy=False), doc_term_columns.reshape(-1), doc_term.indptr),
+            shape=(num_docs, len(term_ids))
+            )
+
+        active_gamma = gamma
+        exp_elogtheta = np.exp(dirichlet_expectation(active_gamma))
+        weighted_counts, count_rows, count_topic = self._term_weights(active_counts, term_topic)
+
+        for _ in range(self.iterations):
+            # The optimal phi for each document term is proportional to
+            # exp_elogtheta * topic_word, phi_norm is its normaliser. phi itself
+            # is never stored, it is folded into the gamma update (Lee & Seung 2001)
+            if len(active) == 1:
+                # Plain matrix products are quicker for the common case of a single document
+                phi_norm = count_topic @ exp_elogtheta[0] + epsilon
+                topic_weights = (active_counts.data / phi_norm) @ count_topic
+            else:
+                phi_norm = np.einsum('ij,ij->i', exp_elogtheta[count_rows], count_topic) + epsilon
+                np.divide(active_counts.data, phi_norm, out=weighted_counts.data)
+                topic_weights = weighted_counts @ term_topic
+
+            last_gamma = active_gamma
+            active_gamma = self.alpha + exp_elogtheta * topic_weights
+            exp_elogtheta = np.exp(dirichlet_expectation(active_gamma))
+
+            mean_change = np.mean(np.abs(active_gamma - last_gamma), axis=1)
+            converged = mean_change < self.gamma_threshold
+            if converged.any():
+                gamma[active[converged]] = active_gamma[converged]
+
+                iterating = ~converged
+                active = active[iterating]
+                if len(active) == 0:
+                    break
+
+                active_counts = active_counts[iterating]
+                active_gamma = active_gamma[iterating]
+                exp_elogtheta = exp_elogtheta[iterating]
+                weighted_counts, count_rows, count_topic = self._term_weights(active_counts, term_topic)
+
+        # Documents that never converged keep their gamma from the last iteration
+        if len(active):
+            gamma[active] = active_gamma
+
+        if num_docs > 1:
+            logger.debug(f'{num_docs - len(active)}/{num_docs} documents converged within {self.iterations} iterations')
+
+        return gamma
+
+    def term_topic(self, term_ids: np.ndarray) -> np.ndarray:
+        """Topic weights of the given terms, as rows (terms x topics) so each term's weights are contiguous."""
+
+        topic_columns = self.topic_word[:, term_ids]
+        if self.topic_scale is not None:
+            topic_columns = dequantize_topic_word(topic_columns, self.topic_scale)
+
+        return np.ascontiguousarray(topic_columns.T)
+
+    @staticmethod
+    def _term_weights(counts: sparse.csr_matrix, term_topic: np.ndarray):
+        """Per iteration work arrays for the documents in counts, rebuilt only when documents converge.
+
+        Returns a copy of counts to hold the counts weighted by phi_norm, and for
+        every stored count its document row and its term's topic weights.
+        """
+
+        count_rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        return counts.copy(), count_rows, term_topic[counts.indices]
+
+    def preload(self):
+        """Read the whole topic-word matrix, so none of it is paged in from disk while labelling."""
+
+        np.sum(self.topic_word, dtype=np.float64)
+
+    def topic_distributions(self, doc_term: sparse.csr_matrix) -> np.ndarray:
+        """Normalised num_docs x num_topics topic distribution of each document."""
+
+        gamma = self.inference(doc_term)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+    def topic_vectors(self, doc_term: sparse.csr_matrix) -> List[List[Tuple[int, float]]]:
+        """Topic distribution of each document as (topic_num, probability), leaving out the improbable topics.
+
+        The same format as LdaModel[bow] for a single document.
+        """
+
+        return [
+            [(topic_num, probability) for topic_num, probability in enumerate(topic_distribution)
+             if probability >= self.minimum_probability]
+            for topic_distribution in self.topic_distributions(doc_term)
+        ]
@@ -0,0 +1,172 @@
+import functools
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import config
+
+'''
+    Per invocation metrics written to stdout as CloudWatch Embedded Metric
+    Format (EMF) JSON lines, so CloudWatch extracts them as metrics (with
+    percentiles) from the lambda logs without a metrics agent.
+
+    Stages are timed with timed(), as a decorator or context manager. When
+    metrics are disabled, or outside of an invocation, nothing is recorded and
+    timed() only costs a context variable lookup.
+'''
+
+# Recorder for the invocation being handled, None if metrics are disabled or
+# outside of an invocation. Work submitted to other threads needs to be run in a
+# copy of the context, e.g. executor.submit(contextvars.copy_context().run, function)
+_recorder: ContextVar[Optional['MetricsRecorder']] = ContextVar('metrics_recorder', default=None)
+
+# True until the first invocation in this container has started
+_cold_start = True
+
+
+class MetricsRecorder:
+    """Collects the metrics and properties for one invocation and formats them as EMF."""
+
+    def __init__(self, namespace: str, dimensions: Dict[str, str]):
+        self.namespace = namespace
+        self.dimensions = dimensions
+        self.metrics: Dict[str, List[float]] = {}
+        self.units: Dict[str, str] = {}
+        self.properties: Dict[str, Any] = {}
+
+    def put_metric(self, name: str, value: float, unit: str = 'Milliseconds'):
+        self.metrics.setdefault(name, []).append(value)
+        self.units[name] = unit
+
+    def set_property(self, name: str, value: Any):
+        self.properties[name] = value
+
+    def to_emf(self) -> Dict[str, Any]:
+        emf = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': self.units[name]} for name in self.metrics],
+                }],
+            },
+        }
+        emf.update(self.properties)
+        emf.update(self.dimensions)
+        emf.update({name: values[0] if len(values) == 1 else values for name, values in self.metrics.items()})
+
+        return emf
+
+
+def start_invocation(**properties) -> Optional[MetricsRecorder]:
+    """Start recording metrics for an invocation, returns None if metrics are disabled."""
+
+    global _cold_start
+    cold_start, _cold_start = _cold_start, False
+
+    if not config.metrics_enabled:
+        return None
+
+    recorder = MetricsRecorder(
+        config.metrics_namespace, {'Service': config.metrics_service, 'ColdStart': str(cold_start).lower()}
+        )
+    for name, value in properties.items():
+        recorder.set_property(name, value)
+
+    _recorder.set(recorder)
+    return recorder
+
+
+def flush():
+    """Write the metrics recorded for the current invocation as an EMF line and stop recording."""
+
+    recorder = _recorder.get()
+    if recorder is None:
+        return
+
+    _recorder.set(None)
+    if recorder.metrics:
+        print(json.dumps(recorder.to_emf(), default=str))
+
+
+def put_metric(name: str, value: float, unit: str = 'Milliseconds'):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.put_metric(name, value, unit)
+
+
+def set_property(name: str, value: Any):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.set_property(name, value)
+
+
+def recording() -> bool:
+    """Whether metrics are being recorded, to skip working out values that won't be used."""
+
+    return _recorder.get() is not None
+
+
+class timed:
+    """Record how long a stage takes in milliseconds, as a decorator or a context manager.
+
+    e.g.
+        @timed('get_topic_vector')
+        def get_topic_vector(...):
+
+        with timed('inference'):
+            ...
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._recorder = _recorder.get()
+        if self._recorder is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._recorder is not None:
+            self._recorder.put_metric(self.stage, (time.perf_counter() - self._start) * 1000)
+
+    def __call__(self, function):
+        stage = self.stage
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            recorder = _recorder.get()
+            if recorder is None:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.put_metric(stage, (time.perf_counter() - start) * 1000)
+
+        return timed_function
+
+
+def invocation(stage: str):
+    """Decorator for an entry point: records metrics for each call, timing it as stage, and flushes them."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def invoked_function(*args, **kwargs):
+            if not config.metrics_enabled:
+                return function(*args, **kwargs)
+
+            start_invocation()
+            try:
+                with timed(stage):
+                    return function(*args, **kwargs)
+            finally:
+                flush()
+
+        return invoked_function
+
+    return decorator
@@ -0,0 +1,338 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Downloads the models from S3 into the local model directory.
+
+    Models are either a single archive (.zip, .tar or .tar.gz) which is
+    extracted member by member as it is downloaded, or separate objects under
+    an S3 prefix which are downloaded in parallel. Everything is written to a
+    staging directory of its own that is only moved into place once complete,
+    along with a marker file recording the size and checksum of every file, so
+    a cold start that crashed part way through never leaves a model directory.
+
+    A model directory whose marker doesn't match its files is downloaded again.
+    One without a marker wasn't downloaded here, e.g. the models/ of a checkout,
+    so is used as it is and never replaced.
+
+    The files the lambda loads are checked for before the models are used, so
+    an archive without them, e.g. one zipped before make build_models existed,
+    fails with the files missing rather than when a model is first loaded.
+'''
+
+COMPLETE_MARKER = '.complete.json'
+
+# Size of the ranged reads used to stream zip archives from S3
+ZIP_READ_BUFFER_SIZE = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Model directories already checked by this process, so warm invocations don't recheck
+_verified_model_paths = set()
+# Held while checking and fetching, so concurrent callers download the models once
+_fetch_lock = threading.Lock()
+
+
+def fetch_models(
+        model_path: str,
+        bucket: Optional[str] = None,
+        key: Optional[str] = None,
+        prefix: Optional[str] = None,
+        s3_client=None,
+        required_files: Iterable[str] = ()):
+    """Make sure a complete copy of the models is in model_path, downloading them if not.
+
+    Args:
+        model_path: Local directory to put the models in.
+        bucket: S3 bucket holding the models, config.model_bucket by default.
+        key: Key of the model archive in the bucket, used when no prefix is given, config.model_zip_s3_key by default.
+        prefix: If not empty, every object under this prefix is downloaded as a model file,
+            config.model_s3_prefix by default.
+        s3_client: boto3 S3 client to download with, by default one for config.s3_endpoint_url.
+        required_files: Files, relative to model_path, the models must include, e.g. topic_labelling.models.filenames().
+
+    Raises:
+        Exception: If any of required_files are missing once the models are in model_path.
+    """
+
+    if model_path in _verified_model_paths:
+        return
+
+    with _fetch_lock:
+        if model_path in _verified_model_paths:
+            return
+
+        if os.path.isdir(model_path) and not os.path.exists(os.path.join(model_path, COMPLETE_MARKER)):
+            logger.info(f'Using the models already in {model_path}, which has no {COMPLETE_MARKER} to check them by')
+        elif not models_complete(model_path):
+            # config is read here rather than in the defaults, so overriding it after import takes effect
+            download_to(
+                model_path, bucket or config.model_bucket, key or config.model_zip_s3_key,
+                config.model_s3_prefix if prefix is None else prefix, s3_client
+                )
+
+        check_required_files(model_path, required_files)
+        _verified_model_paths.add(model_path)
+
+
+def check_required_files(model_path: str, required_files: Iterable[str]):
+    """Raise an error naming any of required_files missing from model_path."""
+
+    missing = [filename for filename in required_files if not os.path.isfile(os.path.join(model_path, filename))]
+    if missing:
+        raise Exception(f"Models in {model_path} are missing {', '.join(missing)}. The model archive may predate "
+                        f"the inference artifacts, run make build_models and upload models/ again")
+
+
+def download_to(model_path: str, bucket: str, key: str, prefix: Optional[str], s3_client=None):
+    """Download the models into a staging directory of this call's own, then swap it in for model_path.
+
+    model_path must either not exist or be a download with a marker, anything
+    else would be deleted.
+    """
+
+    source = f's3://{bucket}/{prefix}' if prefix else f's3://{bucket}/{key}'
+    logger.debug(f'Fetching models from {source} to local path: {model_path}')
+
+    parent_path = os.path.dirname(os.path.abspath(model_path))
+    os.makedirs(parent_path, exist_ok=True)
+    staging_path = tempfile.mkdtemp(prefix=f'{os.path.basename(model_path)}.partial-', dir=parent_path)
+
+    try:
+        if s3_client is None:
+            s3_client = create_s3_client()
+        if prefix:
+            checksums = download_objects(s3_client, bucket, prefix, staging_path)
+        elif key.endswith('.zip'):
+            checksums = extract_zip(s3_client, bucket, key, staging_path)
+        else:
+            checksums = extract_tar(s3_client, bucket, key, staging_path)
+
+        with open(os.path.join(staging_path, COMPLETE_MARKER), 'w') as marker_file:
+            json.dump({'source': source, 'files': checksums}, marker_file)
+
+        # Move a stale download aside rather than deleting it in place, so
+        # model_path is always either the old models or the new ones
+        stale_path = None
+        if os.path.exists(model_path):
+            stale_path = f'{staging_path}.stale'
+            os.rename(model_path, stale_path)
+
+        try:
+            os.rename(staging_path, model_path)
+        except OSError:
+            # Another process moved its download into place first
+            if not models_complete(model_path):
+                raise
+            logger.debug(f'Models in {model_path} were fetched by another process')
+        finally:
+            if stale_path:
+                shutil.rmtree(stale_path, ignore_errors=True)
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+    logger.debug(f'Fetched {len(checksums)} model files to {model_path}')
+
+
+def create_s3_client(endpoint_url: Optional[str] = None):
+    """boto3 S3 client for AWS, or for the S3 compatible store at endpoint_url, config.s3_endpoint_url by default."""
+
+    # Imported here so boto3 is only loaded when the models need downloading
+    import boto3
+
+    endpoint_url = config.s3_endpoint_url if endpoint_url is None else endpoint_url
+
+    if not endpoint_url:
+        return boto3.client('s3')
+
+    from botocore.config import Config
+    return boto3.client('s3', endpoint_url=endpoint_url, config=Config(s3={'addressing_style': 'path'}))
+
+
+def models_complete(model_path: str) -> bool:
+    """Check model_path has a completion marker and every file it lists matches its size and checksum.
+
+    This reads every file, so is done once per process, which also leaves the
+    files in the page cache for loading.
+    """
+
+    try:
+        with open(os.path.join(model_path, COMPLETE_MARKER)) as marker_file:
+            marker = json.load(marker_file)
+    except (OSError, ValueError):
+        return False
+
+    for filename, expected in marker['files'].items():
+        path = os.path.join(model_path, filename)
+        if not os.path.isfile(path) or os.path.getsize(path) != expected['size']:
+            logger.warning(f'Model file {path} is missing or incomplete')
+            return False
+
+        if file_sha256(path) != expected['sha256']:
+            logger.warning(f'Model file {path} does not match its checksum')
+            return False
+
+    return True
+
+
+def recorded_checksums(model_path: str) -> Optional[Dict[str, str]]:
+    """sha256 of each model file by filename, as recorded in model_path's marker. None if it has no marker.
+
+    Only the small marker file is read, so this is cheap enough for every request.
+    """
+
+    try:
+        with open(os.path.join(model_path, COMPLETE_MARKER)) as marker_file:
+            marker = json.load(marker_file)
+    except (OSError, ValueError):
+        return None
+
+    return {filename: expected['sha256'] for filename, expected in marker['files'].items()}
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as model_file:
+        for chunk in iter(lambda: model_file.read(COPY_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def download_objects(s3_client, bucket: str, prefix: str, destination: str) -> Dict[str, Dict]:
+    """Download every object under prefix in parallel, streaming each to its file."""
+
+    paginator = s3_client.get_paginator('list_objects_v2')
+    keys = [
+        s3_object['Key']
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for s3_object in page.get('Contents', [])
+        if not s3_object['Key'].endswith('/')
+    ]
+
+    if not keys:
+        raise Exception(f'No models found in s3://{bucket}/{prefix}')
+
+    def download_object(key):
+        filename = key[len(prefix):].lstrip('/')
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        return filename, write_model_file(body, destination, filename)
+
+    with ThreadPoolExecutor(max_workers=config.model_download_threads) as pool:
+        return dict(pool.map(download_object, keys))
+
+
+def extract_zip(s3_client, bucket: str, key: str, destination: str) -> Dict[str, Dict]:
+    """Extract a zip archive straight from S3, reading it with ranged requests.
+
+    Only the central directory and the bytes of each member are read, so
+    members are written out as they arrive rather than after the whole archive
+    has been saved to disk.
+    """
+
+    reader = io.BufferedReader(S3RangeReader(s3_client, bucket, key), buffer_size=ZIP_READ_BUFFER_SIZE)
+
+    checksums = {}
+    with zipfile.ZipFile(reader) as zip_file:
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            with zip_file.open(member) as member_file:
+                checksums[member.filename] = write_model_file(member_file, destination, member.filename)
+
+    return checksums
+
+
+def extract_tar(s3_client, bucket: str, key: str, destination: str) -> Dict[str, Dict]:
+    """Extract a (optionally compressed) tar archive while it streams from S3."""
+
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+
+    checksums = {}
+    with tarfile.open(fileobj=body, mode='r|*') as tar_file:
+        for member in tar_file:
+            if not member.isfile():
+                continue
+            checksums[member.name] = write_model_file(tar_file.extractfile(member), destination, member.name)
+
+    return checksums
+
+
+def write_model_file(source, destination: str, filename: str) -> Dict:
+    """Copy a file object into destination in chunks, returning its size and checksum."""
+
+    path = os.path.realpath(os.path.join(destination, filename))
+    if not path.startswith(os.path.realpath(destination) + os.sep):
+        raise Exception(f'Model file {filename} would be written outside of {destination}')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as model_file:
+        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            model_file.write(chunk)
+            size += len(chunk)
+
+    return {'size': size, 'sha256': sha256.hexdigest()}
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable read only file object over an S3 object, each read is a ranged GET."""
+
+    def __init__(self, s3_client, bucket: str, key: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+
+        end = min(self.position + len(buffer), self.size) - 1
+        data = self.s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-{end}'
+            )['Body'].read()
+
+        buffer[:len(data)] = data
+        self.position += len(data)
+
+        return len(data)
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Load-once registry for the model artifacts under config.local_model_path.
+
+    Each artifact is registered with the files it is built from and a loader.
+    The first call to get() loads it, later calls on a warm container hand back
+    the same object. If any of the artifact's files change (mtime or size) the
+    artifact is reloaded on the next get().
+'''
+
+Loader = Callable[[List[str]], Any]
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+
+
+def file_fingerprint(paths: List[str]) -> Fingerprint:
+    """Cheap fingerprint of a set of files: path, mtime in ns and size for each file."""
+
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+
+    return tuple(fingerprint)
+
+
+class ModelRegistry:
+    """Holds one loaded instance of each registered model artifact per container."""
+
+    def __init__(self, model_path_getter: Callable[[], str] = lambda: config.local_model_path):
+        # The model path is read on every call as config.local_model_path is
+        # overridden when running locally
+        self._model_path_getter = model_path_getter
+        self._loaders: Dict[str, Tuple[List[str], Loader]] = {}
+        self._loaded: Dict[str, Tuple[Fingerprint, Any]] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, filenames: List[str], loader: Loader):
+        """Register an artifact built by loader from filenames (relative to the model path)."""
+
+        with self._lock:
+            self._loaders[name] = (filenames, loader)
+            self._loaded.pop(name, None)
+
+    def names(self) -> List[str]:
+        return sorted(self._loaders)
+
+    def filenames(self) -> List[str]:
+        """Every file the registered artifacts are built from, relative to the model path."""
+
+        return sorted({filename for filenames, _ in self._loaders.values() for filename in filenames})
+
+    def paths(self, name: str) -> List[str]:
+        filenames, _ = self._loaders[name]
+        model_path = self._model_path_getter()
+        return [os.path.join(model_path, filename) for filename in filenames]
+
+    def get(self, name: str) -> Any:
+        """Return the loaded artifact, loading or reloading it if its files have changed."""
+
+        if name not in self._loaders:
+            raise KeyError(f'No model artifact registered with name {name}')
+
+        paths = self.paths(name)
+        fingerprint = file_fingerprint(paths)
+
+        loaded = self._loaded.get(name)
+        if loaded is not None and loaded[0] == fingerprint:
+            return loaded[1]
+
+        with self._lock:
+            # Another thread may have loaded it while we waited for the lock
+            loaded = self._loaded.get(name)
+            if loaded is not None and loaded[0] == fingerprint:
+                return loaded[1]
+
+            logger.debug(f'Loading model artifact {name} from {paths}')
+            _, loader = self._loaders[name]
+            artifact = loader(paths)
+            self._loaded[name] = (fingerprint, artifact)
+
+            return artifact
+
+    def version(self, checksums: Optional[Dict[str, str]] = None) -> str:
+        """Hash identifying the current set of artifact files, changes when any of them change.
+
+        Args:
+            checksums: Known checksums of the files by filename, e.g. from the download marker.
+                Files with a checksum are identified by it without being looked at, the
+                rest by their fingerprint.
+        """
+
+        checksums = checksums or {}
+        file_versions = []
+        for name in self.names():
+            filenames, _ = self._loaders[name]
+            for filename, path in zip(filenames, self.paths(name)):
+                if filename in checksums:
+                    file_versions.append((filename, checksums[filename]))
+                else:
+                    file_versions.append(file_fingerprint([path]))
+
+        return hashlib.sha1(repr(file_versions).encode('utf-8')).hexdigest()
+
+    def load_all(self):
+        """Load every registered artifact, e.g. to warm a fresh container."""
+
+        for name in self.names():
+            self.get(name)
+
+    def clear(self, name: Optional[str] = None):
+        """Drop loaded artifacts so they are reloaded on the next get()."""
+
+        with self._lock:
+            if name is None:
+                self._loaded.clear()
+            else:
+                self._loaded.pop(name, None)
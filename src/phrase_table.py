@@ -0,0 +1,79 @@
+import json
+from typing import Iterable, Iterator, List, Sequence
+
+'''
+    Frozen ngram phrase table, the accepted phrases of the trained gensim
+    Phrases model without its vocabulary counts. Built by
+    scripts/build_phrase_table.py.
+'''
+
+
+class PhraseTable:
+    """Joins accepted phrases in a list of tokens, giving the same tokens as the gensim Phrases model.
+
+    Args:
+        phrases: Accepted phrases, each as its tokens including any common terms in between,
+            e.g. [('social', 'distancing'), ('secretary', 'of', 'state')].
+        common_terms: Terms that can appear inside a phrase without breaking it, e.g. 'of'.
+        delimiter: String the tokens of a phrase are joined with.
+    """
+
+    def __init__(self, phrases: Iterable[Sequence[str]], common_terms: Iterable[str] = (), delimiter: str = '_'):
+        self.phrases = {tuple(phrase) for phrase in phrases}
+        self.common_terms = frozenset(common_terms)
+        self.delimiter = delimiter
+
+    @classmethod
+    def load(cls, path: str) -> 'PhraseTable':
+        with open(path) as phrases_file:
+            table = json.load(phrases_file)
+
+        return cls(table['phrases'], table['common_terms'], table['delimiter'])
+
+    def save(self, path: str):
+        with open(path, 'w') as phrases_file:
+            json.dump({
+                'delimiter': self.delimiter,
+                'common_terms': sorted(self.common_terms),
+                'phrases': sorted(self.phrases),
+            }, phrases_file)
+
+    def apply(self, tokens: Iterable[str]) -> List[str]:
+        """Join the phrases in tokens.
+
+        This follows gensim's SentenceAnalyzer.analyze_sentence exactly, only
+        looking phrases up in the table instead of scoring them, so it gives the
+        same output, including its quirks, e.g. empty tokens are dropped.
+        """
+
+        return list(self.iter_apply(tokens))
+
+    def iter_apply(self, tokens: Iterable[str]) -> Iterator[str]:
+        """Generator version of apply, tokens are consumed and yielded as they're joined."""
+
+        last_uncommon = None
+        in_between = []
+
+        for token in tokens:
+            is_common = token in self.common_terms
+
+            if not is_common and last_uncommon:
+                chain = (last_uncommon, *in_between, token)
+                if chain in self.phrases:
+                    yield self.delimiter.join(chain)
+                    last_uncommon = None
+                else:
+                    yield last_uncommon
+                    yield from in_between
+                    last_uncommon = token
+                in_between = []
+            elif not is_common and not last_uncommon:
+                last_uncommon = token
+            elif last_uncommon:
+                in_between.append(token)
+            else:
+                yield token
+
+        if last_uncommon:
+            yield last_uncommon
+            yield from in_between
@@ -1,16 +1,27 @@
-import emoji
-import slack
 import hmac
 import hashlib
 
+import config
+
 '''
     Functions for posting messages to slack
+
+    slack and emoji are imported when first used rather than with this module,
+    so they aren't loaded for events that are rejected before posting anything
 '''
 
-def initialise_slack_client(slack_token):
-    return slack.WebClient(slack_token)
+def emojize(shortcode):
+    import emoji
+    return emoji.emojize(shortcode)
+
+def initialise_slack_client(slack_token, base_url=None):
+    import slack
+    # config is read here rather than in the default, so overriding it after import takes effect
+    return slack.WebClient(slack_token, base_url=base_url or config.slack_api_url)
 
-def post_message_to_slack(slack_client, slack_channel, message, emoji=emoji.emojize(':chart_with_upwards_trend:')):
+def post_message_to_slack(slack_client, slack_channel, message, emoji=None):
+    if emoji is None:
+        emoji = emojize(':chart_with_upwards_trend:')
     slack_text = f"{emoji} {message}"
 
     try:
@@ -26,7 +37,7 @@ def post_message_to_slack(slack_client, slack_channel, message, emoji=emoji.emoj
         print(f"Error writing to slack, {e}")
 
 def post_warning_to_slack(slack_client, slack_channel, error_message):
-    slack_text = f"{emoji.emojize(':warning:')} {error_message}"
+    slack_text = f"{emojize(':warning:')} {error_message}"
 
     try:
         slack_client.api_call(
@@ -42,7 +53,7 @@ def post_warning_to_slack(slack_client, slack_channel, error_message):
 
 
 def post_error_to_slack(slack_client, slack_channel, error_message):
-    slack_text = f"{emoji.emojize(':bangbang:')} ERROR: {error_message}"
+    slack_text = f"{emojize(':bangbang:')} ERROR: {error_message}"
 
     try:
         slack_client.api_call(
@@ -88,4 +99,4 @@ def post_error_to_slack(slack_client, slack_channel, error_message):
 
 # import os 
 # s = initialise_slack_client(os.environ['STATS_RELEASES_SLACK_AUTH_TOKEN'])
-# post_message_to_slack(s, "DCPE887LK", emoji.emojize(':heart:'))
\ No newline at end of file
+# post_message_to_slack(s, "DCPE887LK", emojize(':heart:'))
\ No newline at end of file
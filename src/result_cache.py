@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Hashable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Caches for article content and topic labels, so articles that are asked
+    about again don't need fetching from CPS or running through the model
+'''
+
+
+class ResultCache:
+    """Bounded in memory LRU cache with a TTL and an optional on disk tier.
+
+    The disk tier keeps entries in cache_dir as JSON files, so on lambda they
+    survive the process being restarted in a warm container as long as /tmp does.
+    Entries are written to it on a background thread, off the request path.
+
+    Settings not given are read from config.cache_max_entries, cache_ttl_seconds
+    and cache_dir whenever they are used, so overriding config after the module
+    level caches are created takes effect.
+
+    Args:
+        name: Name of the cache, used for its subdirectory in cache_dir.
+        max_entries: Maximum number of entries held in memory, least recently used are dropped first.
+        ttl_seconds: Seconds an entry is valid for, so edited articles are picked up.
+        cache_dir: Directory for the disk tier, empty to only cache in memory.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            max_entries: Optional[int] = None,
+            ttl_seconds: Optional[float] = None,
+            cache_dir: Optional[str] = None):
+        self.name = name
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._cache_dir = cache_dir
+
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        # One thread so writes happen in the order put, the thread is only started by the first write
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{name}-cache-writer')
+        self._last_write: Optional[Future] = None
+
+    @property
+    def max_entries(self) -> int:
+        return config.cache_max_entries if self._max_entries is None else self._max_entries
+
+    @property
+    def ttl_seconds(self) -> float:
+        return config.cache_ttl_seconds if self._ttl_seconds is None else self._ttl_seconds
+
+    @property
+    def cache_dir(self) -> Optional[str]:
+        cache_dir = config.cache_dir if self._cache_dir is None else self._cache_dir
+        return os.path.join(cache_dir, self.name) if cache_dir else None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if there isn't one or it has expired."""
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        entry = self._read_from_disk(key, now)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        self._put_in_memory(key, value, expires_at)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Cache a JSON serialisable value for key."""
+
+        expires_at = time.time() + self.ttl_seconds
+        self._put_in_memory(key, value, expires_at)
+        if self.cache_dir:
+            self._last_write = self._writer.submit(self._write_to_disk, key, value, expires_at)
+
+    def flush(self):
+        """Wait for the entries put so far to be written to the disk tier."""
+
+        last_write = self._last_write
+        if last_write is not None:
+            last_write.result()
+
+    def clear(self):
+        self.flush()
+        with self._lock:
+            self._entries.clear()
+
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for filename in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def _put_in_memory(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key) -> str:
+        key_hash = hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key_hash}.json')
+
+    def _read_from_disk(self, key, now):
+        if not self.cache_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        if entry['expires_at'] <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return entry['expires_at'], entry['value']
+
+    def _write_to_disk(self, key, value, expires_at):
+        if not self.cache_dir:
+            return
+
+        path = self._disk_path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, 'w') as cache_file:
+                json.dump({'expires_at': expires_at, 'value': value}, cache_file)
+            # Replace in one go so readers never see a half written file
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            # The cache is only an optimisation, carry on without the disk tier
+            logger.warning(f'Could not write to {self.name} cache: {e}')
+
+
+# Keyed by article id, values are [title, content]
+article_cache = ResultCache('articles')
+
+# Keyed by (article id, model version, labelling settings), values are the assigned topic labels
+label_cache = ResultCache('labels')
@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Coalescing of concurrent identical requests, so when several people ask
+    for the labels of the same article at once it is fetched and labelled
+    once, with everyone waiting on that one call and sharing its result.
+'''
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, callers with the same key wait for and share its result.
+
+    Only calls in flight are shared, once a call returns the next call for its
+    key runs again, caching results is left to the caches in result_cache.
+
+    Args:
+        name: Name of what's being coalesced, used in the logs.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return function(*args, **kwargs), or the result of the call for key already in flight.
+
+        If the call raises, every caller waiting on it gets the exception.
+        """
+
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = self._in_flight[key] = Future()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            logger.debug(f'Waiting on the {self.name} call in flight for {key}')
+            metrics.put_metric(f'{self.name}_coalesced', 1, 'Count')
+            return call.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            call.set_exception(e)
+            raise
+
+        self._finish(key)
+        call.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Number of calls made, callers that shared a call in flight instead and calls in flight now."""
+
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
+
+    def _finish(self, key: Hashable):
+        # Removed before the result is set, so callers from then on start a new call
+        with self._lock:
+            del self._in_flight[key]
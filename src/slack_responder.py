@@ -0,0 +1,101 @@
+import contextvars
+import logging
+from concurrent.futures import Executor, Future, wait
+from typing import List, Optional
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    Replies to a slack slash command as one message, posted in the background.
+
+    Lines of the reply are collected with add() and posted together by send(),
+    so e.g. an article's title and labels are one API call rather than two.
+    Replies go to the command's response_url, which posts in the channel the
+    command was used in without needing the bot to be a member of it, falling
+    back to chat.postMessage when there is no response_url or posting to it
+    fails.
+'''
+
+
+class SlackResponder:
+    """Collects the lines of a reply to a slack command and posts them as one message.
+
+    Args:
+        slack_client: slack WebClient, used for chat.postMessage.
+        slack_channel: Channel to post to with chat.postMessage.
+        executor: Runs the posts, so the caller carries on while slack responds.
+        response_url: The slash command's response_url, if it has one.
+    """
+
+    def __init__(self, slack_client, slack_channel: str, executor: Executor, response_url: Optional[str] = None):
+        self.slack_client = slack_client
+        self.slack_channel = slack_channel
+        self.executor = executor
+        self.response_url = response_url
+        self.lines: List[str] = []
+        self.posts: List[Future] = []
+
+    def add(self, text: str, emoji: Optional[str] = None):
+        """Add a line to the next message sent, with an emoji in front of it if given."""
+
+        self.lines.append(f"{emoji} {text}" if emoji else text)
+
+    def send(self) -> Optional[Future]:
+        """Post the lines added since the last send as one message, in the background."""
+
+        if not self.lines:
+            return None
+
+        message = "\n".join(self.lines)
+        self.lines = []
+
+        post = self.executor.submit(contextvars.copy_context().run, self.post, message)
+        self.posts.append(post)
+        return post
+
+    def wait(self):
+        """Wait for every message sent to be posted, e.g. before the lambda returns and is frozen."""
+
+        wait(self.posts)
+
+    @metrics.timed('post_to_slack')
+    def post(self, message: str):
+        """Post message to the response_url, or with chat.postMessage if that isn't possible.
+
+        Errors are logged rather than raised, a failed post shouldn't fail the command.
+        """
+
+        if self.response_url and self.post_to_response_url(message):
+            return
+
+        try:
+            self.slack_client.api_call('chat.postMessage', json={'channel': self.slack_channel, 'text': message})
+            logger.info(f"Wrote to {self.slack_channel}")
+        except Exception as e:
+            logger.error(f"Error writing to slack, {e}")
+
+    def post_to_response_url(self, message: str) -> bool:
+        # Imported here as it's only needed once there's something to post
+        import requests
+
+        try:
+            response = requests.post(
+                self.response_url, json={'response_type': 'in_channel', 'text': message},
+                timeout=config.slack_timeout
+                )
+        except requests.RequestException as e:
+            logger.warning(f"Error posting to the response_url, falling back to chat.postMessage, {e}")
+            return False
+
+        if response.status_code != 200:
+            logger.warning(
+                f"response_url returned {response.status_code} {response.text}, falling back to chat.postMessage"
+                )
+            return False
+
+        logger.info(f"Replied to the slack command in {self.slack_channel}")
+        return True
@@ -1,64 +1,206 @@
-import json
 import logging
-import os
 import re
-import string
-from collections import defaultdict
-from typing import Any, Dict, List, Tuple, Optional
+import threading
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 
-import en_core_web_sm
 import numpy as np
-from gensim.corpora.dictionary import Dictionary
-from gensim.models import Phrases
-from gensim.models.wrappers import LdaMallet, ldamallet
 
 import config
+import metrics
+from label_groups import LabelGroups
+from lda_inference import TOPIC_WORD_PRECISIONS, LdaInference, bow_matrix
+from model_registry import ModelRegistry
+from phrase_table import PhraseTable
+from vocabulary import Vocabulary
 
 logger = logging.getLogger(__name__)
 logger.setLevel(config.log_level)
 
-nlp = en_core_web_sm.load()
+# spacy_process only uses token.lemma_ and token.is_stop
+SPACY_DISABLED_PIPES = {
+    # The tagger is kept as the rule based lemmatizer needs POS tags
+    'rule': ['parser', 'ner'],
+    # Lemmas come from the lookup table only, faster but lemmas can differ
+    'lookup': ['tagger', 'parser', 'ner'],
+}
+
+
+def load_nlp(lemmatizer_mode: Optional[str] = None):
+    """Load the spacy en_core_web_sm model with the pipes we don't use disabled, by default in config's mode."""
+
+    lemmatizer_mode = lemmatizer_mode or config.spacy_lemmatizer_mode
+
+    if lemmatizer_mode not in SPACY_DISABLED_PIPES:
+        raise ValueError(
+            f'Unknown spacy lemmatizer mode {lemmatizer_mode}, expected one of {list(SPACY_DISABLED_PIPES)}'
+            )
+
+    import en_core_web_sm
+    spacy_nlp = en_core_web_sm.load(disable=SPACY_DISABLED_PIPES[lemmatizer_mode])
+
+    # Add custom stopword(s) to the spacy model
+    custom_stop_words = {'coronavirus'}
+    spacy_nlp.Defaults.stop_words |= custom_stop_words
+
+    return spacy_nlp
+
+
+# The spacy pipeline, loaded by initialise() or on first use rather than on
+# import so the lambda can check an event before paying for it
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    """Return the spacy pipeline, loading it on the first call."""
+
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = load_nlp()
+
+    return _nlp
+
+
+def _load_vocabulary(paths: List[str]) -> Vocabulary:
+    """Memory map the sorted tokens and their ids saved by scripts/build_inference_artifact.py."""
+
+    return Vocabulary.load(paths[0], paths[1])
+
+
+def lda_model_files(precision: str) -> List[str]:
+    """Files of the topic-word matrix at the given precision and alpha, then the quantized matrix's scale."""
+
+    if precision not in TOPIC_WORD_PRECISIONS:
+        raise ValueError(f'Unknown topic-word precision {precision}, expected one of {list(TOPIC_WORD_PRECISIONS)}')
+
+    if precision == 'float64':
+        return ['lda_topic_word.npy', 'lda_alpha.npy']
+
+    return [f'lda_topic_word_{precision}.npy', 'lda_alpha.npy', f'lda_topic_word_{precision}_scale.npy']
+
+
+def _load_lda_model(paths: List[str]) -> LdaInference:
+    """Load the inference engine over the precomputed topic-word matrix and alpha.
+
+    The topic-word weights are memory mapped from scripts/build_inference_artifact.py
+    and the inference settings are the defaults of gensim's malletmodel2ldamodel,
+    which the LdaModel the lambda used to label with was converted by.
+    """
+
+    topic_word = np.load(paths[0], mmap_mode='r')
+    alpha = np.load(paths[1])
+    topic_scale = np.load(paths[2]) if len(paths) > 2 else None
+
+    return LdaInference(
+        topic_word, alpha, iterations=50, gamma_threshold=0.001, minimum_probability=0.01, topic_scale=topic_scale
+        )
+
+
+def _load_ngram_model(paths: List[str]) -> PhraseTable:
+    """Load the phrase table frozen from the ngram model by scripts/build_phrase_table.py."""
+
+    return PhraseTable.load(paths[0])
+
+
+def _load_label_groups(paths: List[str]) -> LabelGroups:
+    """Compile topic_labels.json into label groups, the number of topics comes from alpha."""
+
+    return LabelGroups.load(paths[0], num_topics=len(np.load(paths[1])))
+
+
+# Models are loaded once per container and reused on warm invocations
+models = ModelRegistry()
+models.register('vocabulary', ['vocabulary_tokens.npy', 'vocabulary_ids.npy'], _load_vocabulary)
+models.register('lda_model', lda_model_files(config.lda_topic_word_precision), _load_lda_model)
+models.register('ngram_model', ['ngram_phrases.json'], _load_ngram_model)
+models.register('label_groups', ['topic_labels.json', 'lda_alpha.npy'], _load_label_groups)
+
+
+def initialise():
+    """Load spacy and every model up front, so labelling the first article doesn't wait for them."""
+
+    with metrics.timed('load_spacy'):
+        get_nlp()
+
+    models.load_all()
+
+
+# Labelled by warm_up(), made up of words common in the articles
+WARM_UP_DOCUMENT = (
+    "Schools reopen as lockdown restrictions ease. The prime minister said pupils would return to "
+    "classrooms next week, while the health secretary warned that cases and hospital admissions "
+    "were still rising in parts of the country. NHS staff and care homes will get more protective "
+    "equipment and testing. Businesses, shops and restaurants welcomed the news after months of lost "
+    "income, but unions called for clearer guidance on social distancing and face coverings. "
+    "Scientists researching a vaccine said trials were going well."
+    )
+
+
+def warm_up():
+    """Load everything and label a canned document, so the next article is labelled as fast as it can be.
+
+    Besides loading spacy and the models, this reads the memory mapped
+    topic-word matrix into the page cache and runs every stage once, so the
+    first real article doesn't pay for any of it.
+    """
+
+    initialise()
+    models.get('lda_model').preload()
+    assign_topic_labels(WARM_UP_DOCUMENT)
+
+
+# Anything that isn't a lower case letter or whitespace, i.e. numbers, punctuation and non ascii characters
+NON_LETTER_PATTERN = re.compile(r'[^a-z\s]+')
 
 
 def normalise_doc(doc: str) -> str:
-    """Remove numbers, punctuation from text and make all words lower case."""
+    """Remove numbers, punctuation from text and make all words lower case.
+
+    Words are reduced to their ascii letters, words left empty are dropped and
+    the remaining words are separated by single spaces.
+    """
 
     logger.debug('Normalising document')
-    punc = string.punctuation
-    doc = doc.lower()
-    cleaned_tokens = [re.sub(r'([^a-zA-Z ]+?)', '', re.sub(f'([\d\s{punc} ]+?)', '', token)) for token in doc.split()]
 
-    return ' '.join(list(filter(None, cleaned_tokens)))
+    return ' '.join(NON_LETTER_PATTERN.sub('', doc.lower()).split())
 
 
 def spacy_process(doc: str) -> str:
     """Use spacy en_core_web_sm model to remove stop words, lemmatise and remove POS."""
 
     logger.debug('Spacy processing')
-    # Add custom stopword(s) to the spacy model
-    custom_stop_words = {'coronavirus'}
-    nlp.Defaults.stop_words |= custom_stop_words
+    spacy_doc = get_nlp()(doc)
 
-    spacy_doc = nlp(doc)
+    return lemmatise(spacy_doc)
+
+
+def lemmatise(spacy_doc) -> str:
+    """Join the lemmas of the non stop words in a processed spacy doc."""
 
     return ' '.join([token.lemma_ for token in spacy_doc if not token.is_stop])
 
 
 def compute_ngrams(doc: str) -> str:
-    """Load in pre-trained ngram model and apply to article to recover ngrams."""
+    """Apply the pre-trained ngram model to article to recover ngrams."""
 
     logger.debug('Computing N-Grams')
-    ngram_model = Phrases.load(os.path.join(config.local_model_path, 'ngram_model.pkl'))
+    ngram_model = models.get('ngram_model')
 
-    tokens_with_ngrams = ngram_model[doc.split(" ")]
+    tokens_with_ngrams = ngram_model.apply(doc.split(" "))
 
     return " ".join(tokens_with_ngrams)
 
 
+@metrics.timed('preprocess_document')
 def preprocess_document(doc: str) -> List[str]:
     """Apply preprocessing functions to document."""
 
     logger.debug('Preprocessing article...')
+    metrics.put_metric('document_length', len(doc), 'Count')
     normalised = normalise_doc(doc)
     spacy_processed = spacy_process(normalised)
     ngram_computed = compute_ngrams(spacy_processed)
@@ -66,6 +208,81 @@ def preprocess_document(doc: str) -> List[str]:
     return ngram_computed.split(" ")
 
 
+# Chunks of a long article spacy processes at a time, see preprocess_document_stream
+STREAM_BATCH_SIZE = 4
+
+
+def document_chunks(doc: str, chunk_chars: Optional[int] = None) -> Iterator[str]:
+    """Split doc into consecutive chunks of at most chunk_chars characters, config.stream_chunk_chars by default.
+
+    Chunks end at the last paragraph break in them, failing that at the end of
+    the last sentence, failing that at the last space, so normalising each
+    chunk gives the same words as normalising the whole document. Only a run of
+    chunk_chars characters without a space is split mid word.
+    """
+
+    chunk_chars = chunk_chars or config.stream_chunk_chars
+
+    start = 0
+    while len(doc) - start > chunk_chars:
+        end = start + chunk_chars
+        split = doc.rfind('\n', start, end)
+        if split <= start:
+            split = doc.rfind('. ', start, end) + 1
+        if split <= start:
+            split = doc.rfind(' ', start, end)
+        if split <= start:
+            split = end
+
+        yield doc[start:split]
+        start = split
+
+    if start < len(doc):
+        yield doc[start:]
+
+
+@metrics.timed('preprocess_document_stream')
+def preprocess_document_stream(doc: str) -> Counter:
+    """Apply the same preprocessing as preprocess_document to a long document, counting the tokens as they come.
+
+    The document is normalised and run through spacy a few chunks at a time,
+    with the lemmas fed through the ngram phrase table as one stream, so
+    phrases spanning chunks are still joined. Only the counts of each token are
+    kept, so memory is bounded by the chunk size rather than the document length.
+    Chunk boundaries can change the odd lemma, as spacy's tagger doesn't see
+    across them, so documents under config.stream_document_chars are processed whole.
+    """
+
+    logger.debug('Preprocessing article in chunks...')
+    metrics.put_metric('document_length', len(doc), 'Count')
+    normalised_chunks = (normalise_doc(chunk) for chunk in document_chunks(doc))
+    spacy_docs = get_nlp().pipe(normalised_chunks, batch_size=STREAM_BATCH_SIZE)
+    # A chunk of only stop words or punctuation lemmatises to '', which mustn't become a token
+    tokens = (token for token in chain.from_iterable(
+        lemmatise(spacy_doc).split(" ") for spacy_doc in spacy_docs
+        ) if token)
+
+    return Counter(models.get('ngram_model').iter_apply(tokens))
+
+
+def preprocess_documents(docs: Iterable[str]) -> Iterator[List[str]]:
+    """Apply the same preprocessing as preprocess_document to many documents.
+
+    Documents are streamed through spacy's nlp.pipe in batches, with the ngram
+    phrase table applied to each as it comes out.
+    """
+
+    logger.debug('Preprocessing articles...')
+    normalised_docs = (normalise_doc(doc) for doc in docs)
+    spacy_docs = get_nlp().pipe(normalised_docs, batch_size=config.spacy_batch_size)
+    tokenised_docs = (lemmatise(spacy_doc).split(" ") for spacy_doc in spacy_docs)
+
+    ngram_model = models.get('ngram_model')
+    for tokens in tokenised_docs:
+        yield ngram_model.apply(tokens)
+
+
+@metrics.timed('get_topic_vector')
 def get_topic_vector(preprocessed_doc: List[str]) -> List[Tuple[int, float]]:
     """Take in a preprocessed document, covert to bag of words, apply the topic model
     and return the topic distribution.
@@ -78,159 +295,180 @@ def get_topic_vector(preprocessed_doc: List[str]) -> List[Tuple[int, float]]:
         [(0, 0.014330332), (1, 0.22703473), (4, 0.057342175), (8, 0.021801356)...]
     """
 
-    logger.debug('Loading Gensim dictionary')
-    gensim_dictionary = Dictionary.load(os.path.join(config.local_model_path, 'gensim_dictionary'))
+    vocabulary = models.get('vocabulary')
 
     logger.debug('Converting preprocessed article to bag of words')
-    article_bow = gensim_dictionary.doc2bow(preprocessed_doc)
+    article_bow = vocabulary.doc2bow(preprocessed_doc)
 
-    logger.debug('Loading LDA MALLET model')
-    lda_model_unconverted = LdaMallet.load(os.path.join(config.local_model_path, 'lda_model_mallet.model'))
-    lda_model = ldamallet.malletmodel2ldamodel(lda_model_unconverted)
+    return bow_topic_vector(article_bow)
 
-    np.random.seed(100)
-    logger.debug('Producing topic vector')
-    topic_vector = lda_model[article_bow]
 
-    logger.debug(f'Got topic vector: {topic_vector}')
-    return topic_vector
+@metrics.timed('get_topic_vector')
+def get_topic_vector_from_counts(token_counts: Counter) -> List[Tuple[int, float]]:
+    """As get_topic_vector, for a document preprocessed into token counts by preprocess_document_stream."""
 
+    vocabulary = models.get('vocabulary')
 
-def topic_labels_from_vector(topic_vector: List[Tuple[str, float]]) -> Optional[List[Dict[str, Any]]]:
-    """Assigns topic labels from given topic vector.
+    logger.debug('Converting preprocessed article token counts to bag of words')
+    article_bow = vocabulary.counts2bow(token_counts)
 
-    The number of topics assigned is decided by the rule:
+    return bow_topic_vector(article_bow)
 
-    "For an article, as many topics as it takes to surpass the given high threshold, but a maximum of 3 topics,
-    with each topic surpassing a given low threshold of the article."
 
-    If no topics are above the low threshold, then returns 'Other articles'.
+def bow_topic_vector(article_bow: Tuple[np.ndarray, np.ndarray]) -> List[Tuple[int, float]]:
+    """Apply the topic model to a bag of words from the vocabulary, returning the topic vector."""
+
+    lda_model = models.get('lda_model')
+
+    logger.debug('Producing topic vector')
+    topic_vector = lda_model.topic_vectors(bow_matrix([article_bow], lda_model.num_terms))[0]
+
+    logger.debug(f'Got topic vector: {topic_vector}')
+    return topic_vector
+
+
+def get_topic_distributions(preprocessed_docs: List[Union[List[str], Counter]]) -> np.ndarray:
+    """Batch version of get_topic_vector, inference is run over all documents at once.
 
     Args:
-        topic_vector: In form [('Arts/Culture', 0.014330332), ('Scotland', 0.22703473), ('Education', 0.057342175)...]
+        preprocessed_docs: List of documents, each a list of preprocessed words or, for a long document
+            preprocessed by preprocess_document_stream, the counts of its words.
 
     Returns:
-        List of 1-3 dicts of {str: str, str: float} representing
-        {'name': <human-readable topic label>, 'score': <percentage topic weight>}),
-        e.g. [{'name': 'Arts/Culture', 'score': 0.2270347}, {'name': 'Scotland', 'score': 0.514330}],
-        or [{'name': 'Other articles', 'score': 0.99}] if no topics are above the weight threshold.
+        num_docs x num_topics array of the topic distribution of each document.
     """
 
-    low_threshold = config.topic_score_threshold_low
-    high_threshold =  config.topic_score_threshold_high
-
-    # Take top three topics
-    top_three_topics: List[Tuple[str, np.float32]] = sorted(topic_vector, key=lambda x: x[1], reverse=True)[:3]
-
-    # Remove any that are below low_threshold of the article
-    topics_above_threshold = [(topic, percent) for topic, percent in top_three_topics if percent >= low_threshold]
-
-    if not topics_above_threshold:
-        # TODO: still pass back topic weights so that we can publish them to Cloudwatch
-        logger.warning(f'No topics above weight threshold of {low_threshold}; not assigning tags.')
-        return [{"name": config.no_topic_label, "score": 0.99}]
-
-    # Cumulative sum of topic percentages
-    topic_cumsum: np.ndarray = np.cumsum([percent for _, percent in topics_above_threshold], axis=0)
-
-    # If they all add up to less than high_threshold, use all, else just include ones that reach the high_threshold
-    if topic_cumsum[-1] <= high_threshold:
-        topics_to_assign: List[Dict[str, np.float32]] = topics_above_threshold
-    else:
-        # Get index of when the cumsum exceeds high_threshold
-        index = np.argmax(topic_cumsum > high_threshold)
-
-        # Take final topics
-        topics_to_assign: List[Dict[str, np.float32]] = topics_above_threshold[:index+1]
-
-    # Apply text topic labels
-    assigned_topic_labels = [
-        {
-            'name': topic_label,
-            'score': round(percent, 6)  # Score as float to 6 d.p. for JSON serialisation.
-        } for topic_label, percent in topics_to_assign
+    vocabulary = models.get('vocabulary')
+    lda_model = models.get('lda_model')
+
+    logger.debug(f'Converting {len(preprocessed_docs)} preprocessed articles to bag of words')
+    article_bows = [
+        vocabulary.counts2bow(preprocessed_doc) if isinstance(preprocessed_doc, Counter)
+        else vocabulary.doc2bow(preprocessed_doc)
+        for preprocessed_doc in preprocessed_docs
     ]
 
-    return assigned_topic_labels
+    logger.debug('Producing topic distributions')
+    return lda_model.topic_distributions(bow_matrix(article_bows, lda_model.num_terms))
 
 
-def apply_labels_to_vector(topic_vector: List[Tuple[int, float]], topic_labels: Dict[str, str]):
-    """Takes topic vector and topic labels and returns the topic vector with
-    index labels replaced with text labels.
+def assign_topic_labels(doc: str):
+    """Takes a article, gets the topic vector for it and assigns labels.
 
     Args:
-        topic_vector: list of topic index and score.
-        topic_labels: Dictionary mapping topic index to topic textual label.
+        doc: raw article text (headline, summary and body text combined, with no HTML).
 
     Returns:
-        topic vector with index labels replaced with text labels.
+        List of topic labels for an article (between 1 and 3 labels), including the 'Other articles' topic
+        if no topics assigned by the model are over the low threshold.
     """
-    try:
-        return [(topic_labels[str(topic_num)], score) for topic_num, score in topic_vector]
-    except KeyError as e:
-        raise ValueError(
-            f'Topic label does not exist, check topic_labels.json is correct!  \n{e} '
-            )
+    logger.debug(f'Got document of {len(doc)} characters')
+    if len(doc) > config.stream_document_chars:
+        token_counts: Counter = preprocess_document_stream(doc)
+        logger.debug(f'Preprocessed document into {sum(token_counts.values())} tokens')
+
+        topic_vector: List[Tuple[int, float]] = get_topic_vector_from_counts(token_counts)
+        return label_topic_vector(topic_vector)
+
+    preprocessed_doc: List[str] = preprocess_document(doc)
+    logger.debug(f'Preprocessed document into {len(preprocessed_doc)} tokens')
+
+    logger.debug('Calculating topic vector from preprocessed document...')
+    topic_vector: List[Tuple[int, float]] = get_topic_vector(preprocessed_doc)
 
+    return label_topic_vector(topic_vector)
 
-def group_topic_scores(labelled_topic_vector: Dict[str, float]):
-    """Takes a topic vector and combines scores for labels that are the same.
+
+def assign_topic_labels_batch(docs: Iterable[str]) -> List[List[Dict[str, Any]]]:
+    """Batch version of assign_topic_labels for labelling many articles at once.
 
     Args:
-        labelled_topic_vector: of the form
-         [('Arts/Culture', 0.14), ('Scotland', 0.227), ('Arts/Culture', 0.16), ...]
+        docs: raw article texts (headline, summary and body text combined, with no HTML).
 
     Returns:
-        Topic vector with aggregated scores e.g.
-         [('Arts/Culture', 0.30), ('Scotland', 0.227), ...]
+        List with the topic labels for each article, in the same order and format as assign_topic_labels.
     """
-    aggregated_scores = defaultdict(float)
+    docs = list(docs)
+
+    # As in assign_topic_labels, long documents are preprocessed in chunks, spacy can't take them whole
+    short_preprocessed_docs = iter(list(preprocess_documents(
+        doc for doc in docs if len(doc) <= config.stream_document_chars
+        )))
+    preprocessed_docs: List[Union[List[str], Counter]] = [
+        preprocess_document_stream(doc) if len(doc) > config.stream_document_chars else next(short_preprocessed_docs)
+        for doc in docs
+    ]
 
-    for label, percent in labelled_topic_vector:
-        if label != 'REMOVE':
-            aggregated_scores[label] += percent
+    logger.debug(f'Calculating topic distributions for {len(preprocessed_docs)} preprocessed documents...')
+    topic_distributions: np.ndarray = get_topic_distributions(preprocessed_docs)
 
-    labels_with_grouped_scores = list(aggregated_scores.items())
+    return label_topic_distributions(topic_distributions)
 
-    # Check there are no remaining duplicates
-    labels = [t[0] for t in labels_with_grouped_scores]
-    if len(labels) != len(set(labels)):
-        raise ValueError("Still multiple labels in the grouped list.")
 
-    return labels_with_grouped_scores
+def label_topic_vector(topic_vector: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    """Assign labels to a topic vector, in the form [(topic_num, probability), ...] from get_topic_vector."""
 
+    label_groups = models.get('label_groups')
 
-def assign_topic_labels(doc: str):
-    """Takes a article, gets the topic vector for it and assigns labels.
+    topic_distribution = np.zeros((1, label_groups.num_topics))
+    for topic_num, probability in topic_vector:
+        topic_distribution[0, topic_num] = probability
 
-    Args:
-        doc: raw article text (headline, summary and body text combined, with no HTML).
+    return label_topic_distributions(topic_distribution)[0]
 
-    Returns:
-        List of topic labels for an article (between 1 and 3 labels), including the 'Other articles' topic
-        if no topics assigned by the model are over the low threshold.
-    """
-    logger.debug(f'Got document: {doc}')
-    preprocessed_doc: List[str] = preprocess_document(doc)
-    logger.debug(f'Preprocessed document: {preprocessed_doc}')
 
-    logger.debug('Calculating topic vector from preprocessed document...')
-    topic_vector: List[Tuple[int, float]] = get_topic_vector(preprocessed_doc)
+def label_topic_distributions(topic_distributions: np.ndarray) -> List[List[Dict[str, Any]]]:
+    """Assigns topic labels to each of a batch of topic distributions.
+
+    Topics are grouped by their text label, summing their probabilities, and
+    the labels are assigned by the rule:
+
+    "For an article, as many topics as it takes to surpass the given high threshold, but a maximum of 3 topics,
+    with each topic surpassing a given low threshold of the article."
 
-    # load in the topic num to label mapping
-    with open(os.path.join(config.local_model_path, 'topic_labels.json')) as labels_file:
-        topic_labels = json.load(labels_file)
+    If no topics are above the low threshold, the article is labelled 'Other articles'.
 
-    try:
-        # Replace index topic numbers with text labels
-        labelled_topic_vector = apply_labels_to_vector(topic_vector, topic_labels)
+    Args:
+        topic_distributions: num_docs x num_topics topic probabilities.
 
-        # Aggregate scores for topic groups
-        grouped_topic_labels = group_topic_scores(labelled_topic_vector)
-    except ValueError:
-        raise
+    Returns:
+        For each document a list of 1-3 dicts of {str: str, str: float} representing
+        {'name': <human-readable topic label>, 'score': <percentage topic weight>}),
+        e.g. [{'name': 'Arts/Culture', 'score': 0.2270347}, {'name': 'Scotland', 'score': 0.514330}],
+        or [{'name': 'Other articles', 'score': 0.99}] if no topics are above the weight threshold.
+    """
 
-    logger.debug('Assigning topic labels from vector...')
-    assigned_topic_labels = topic_labels_from_vector(grouped_topic_labels)
+    label_groups = models.get('label_groups')
+    lda_model = models.get('lda_model')
 
-    return assigned_topic_labels
+    low_threshold = config.topic_score_threshold_low
+    high_threshold = config.topic_score_threshold_high
+
+    # Topics below the minimum probability are left out of topic vectors, so aren't counted towards a group
+    group_scores, first_topics = label_groups.group(topic_distributions, lda_model.minimum_probability)
+    assigned_labels = label_groups.assign(group_scores, first_topics, low_threshold, high_threshold)
+
+    doc_labels = []
+    for doc_group_scores, doc_first_topics, doc_assigned_labels in zip(group_scores, first_topics, assigned_labels):
+        # Publish the topic weights with the invocation's metrics
+        if metrics.recording():
+            metrics.set_property('topic_weights', {
+                label: round(float(score), 6)
+                for label, score, first_topic in zip(label_groups.labels, doc_group_scores, doc_first_topics)
+                if first_topic < label_groups.num_topics
+            })
+
+        if not doc_assigned_labels:
+            metrics.put_metric('no_topic_assigned', 1, 'Count')
+            logger.warning(f'No topics above weight threshold of {low_threshold}; not assigning tags.')
+            doc_labels.append([{"name": config.no_topic_label, "score": 0.99}])
+            continue
+
+        doc_labels.append([
+            {
+                'name': label,
+                'score': float(round(score, 6))  # Score as float to 6 d.p. for JSON serialisation.
+            } for label, score in doc_assigned_labels
+        ])
+
+    return doc_labels
@@ -0,0 +1,105 @@
+import logging
+from typing import Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+logger.setLevel(config.log_level)
+
+'''
+    The token to id mapping of the gensim dictionary the topic model was
+    trained with, as two arrays rather than a dict of Python strings.
+
+    Tokens are held as a sorted fixed width unicode array with the id of each
+    token in a matching int32 array, both saved as .npy files by
+    scripts/build_inference_artifact.py and memory mapped on load. A token is
+    looked up with a binary search of the sorted tokens, so converting a
+    document to a bag of words is a handful of numpy calls over arrays rather
+    than a Python loop over its tokens.
+'''
+
+# Bag of words as arrays of token ids and their counts, sorted by token id
+BowArrays = Tuple[np.ndarray, np.ndarray]
+
+
+class Vocabulary:
+    """Maps tokens to the ids of the topic model's vocabulary.
+
+    Args:
+        tokens: Sorted unicode array of every token in the vocabulary.
+        ids: int32 id of each token in tokens.
+    """
+
+    def __init__(self, tokens: np.ndarray, ids: np.ndarray):
+        if tokens.shape != ids.shape:
+            raise ValueError(f'Got {len(tokens)} tokens but {len(ids)} ids')
+
+        self.tokens = tokens
+        self.ids = ids
+
+    @classmethod
+    def from_token2id(cls, token2id: Dict[str, int]) -> 'Vocabulary':
+        """Build from a token to id mapping, e.g. the token2id of a gensim Dictionary."""
+
+        tokens = np.array(sorted(token2id), dtype=str)
+        ids = np.fromiter((token2id[token] for token in tokens.tolist()), dtype=np.int32, count=len(tokens))
+
+        return cls(tokens, ids)
+
+    @classmethod
+    def load(cls, tokens_path: str, ids_path: str) -> 'Vocabulary':
+        """Memory map the tokens and ids saved by save()."""
+
+        return cls(np.load(tokens_path, mmap_mode='r'), np.load(ids_path, mmap_mode='r'))
+
+    def save(self, tokens_path: str, ids_path: str):
+        """Save the tokens and ids as .npy files, which load() memory maps."""
+
+        np.save(tokens_path, self.tokens)
+        np.save(ids_path, self.ids)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def doc2bow(self, preprocessed_doc: Sequence[str]) -> BowArrays:
+        """Convert document into bag of words, equivalent to gensim's Dictionary.doc2bow.
+
+        Args:
+            preprocessed_doc: Document as list of preprocessed words.
+
+        Returns:
+            int32 arrays of token ids and their counts, sorted by token id, tokens not in the vocabulary are dropped.
+        """
+
+        if len(preprocessed_doc) == 0 or len(self.tokens) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+        # Each distinct token is looked up once
+        doc_tokens, counts = np.unique(np.asarray(preprocessed_doc, dtype=str), return_counts=True)
+
+        return self._lookup(doc_tokens, counts)
+
+    def counts2bow(self, token_counts: Mapping[str, int]) -> BowArrays:
+        """As doc2bow, for a document already counted into a mapping of token to count, e.g. a Counter."""
+
+        if len(token_counts) == 0 or len(self.tokens) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+        doc_tokens = np.asarray(list(token_counts.keys()), dtype=str)
+        counts = np.fromiter(token_counts.values(), dtype=np.int32, count=len(token_counts))
+
+        return self._lookup(doc_tokens, counts)
+
+    def _lookup(self, doc_tokens: np.ndarray, counts: np.ndarray) -> BowArrays:
+        # The document's tokens keep their own width, casting them to the
+        # vocabulary's would truncate longer tokens into false matches
+        positions = np.searchsorted(self.tokens, doc_tokens)
+        positions[positions == len(self.tokens)] = 0
+        found = self.tokens[positions] == doc_tokens
+
+        token_ids = self.ids[positions[found]]
+        order = np.argsort(token_ids)
+
+        return token_ids[order], counts[found][order].astype(np.int32)